@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+""" Benchmarks of the redaction and hashing primitives
+    Times filter_datum, RedactingFormatter.format, hash_password and
+    is_valid over a grid of message lengths, number of fields, field
+    positions, separators and bcrypt costs, and prints the results as
+    JSON with ops/sec and percentile latencies in microseconds
+    eg.
+        ./benchmark.py --iterations 2000 --output bench.json
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+from typing import Callable, List
+
+import encrypt_password
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum
+
+
+LENGTHS = (64, 512, 4096)
+FIELD_COUNTS = (1, 3, 5)
+POSITIONS = ('start', 'middle', 'end')
+SEPARATORS = (';', '|')
+COSTS = (4, 8, 10, 12)
+
+
+def percentile(timings: List[float], fraction: float) -> float:
+    """ Returns the value below which a fraction of sorted timings fall
+    """
+    index = min(len(timings) - 1, int(fraction * len(timings)))
+    return timings[index]
+
+
+def measure(func: Callable[[], object], iterations: int,
+            warmup: int = 10) -> dict:
+    """ Times func and summarizes its latencies
+        Args:
+            func: the callable to time, called without arguments
+            iterations: number of timed calls
+            warmup: number of untimed calls made first
+        Returns:
+            dict: ops/sec and mean, p50, p90, p99 latencies in microseconds
+    """
+    for _ in range(warmup):
+        func()
+    timings = []
+    clock = time.perf_counter
+    for _ in range(iterations):
+        started = clock()
+        func()
+        timings.append((clock() - started) * 1e6)
+    timings.sort()
+    total = sum(timings)
+    return {
+        'iterations': iterations,
+        'ops_per_sec': iterations / total * 1e6 if total else None,
+        'mean_us': total / iterations,
+        'p50_us': percentile(timings, 0.50),
+        'p90_us': percentile(timings, 0.90),
+        'p99_us': percentile(timings, 0.99),
+    }
+
+
+def make_message(length: int, fields: List[str], position: str,
+                 separator: str) -> str:
+    """ Builds a key=value message of about length characters
+        The PII fields are placed at the start, middle or end of
+        non-PII padding fields
+    """
+    pii = ["{}=value_{}{}".format(field, field, separator)
+           for field in fields]
+    padding = []
+    size = sum(len(pair) for pair in pii)
+    while size < length:
+        pair = "key{}=padding_value{}".format(len(padding), separator)
+        padding.append(pair)
+        size += len(pair)
+    if position == 'start':
+        pairs = pii + padding
+    elif position == 'end':
+        pairs = padding + pii
+    else:
+        half = len(padding) // 2
+        pairs = padding[:half] + pii + padding[half:]
+    return "".join(pairs)
+
+
+def bench_redaction(iterations: int) -> List[dict]:
+    """ Benchmarks filter_datum and RedactingFormatter.format, the
+        formatter only being timed with its own separator
+    """
+    results = []
+    for separator in SEPARATORS:
+        for count in FIELD_COUNTS:
+            fields = list(PII_FIELDS[:count])
+            formatter = RedactingFormatter(fields)
+            for length in LENGTHS:
+                for position in POSITIONS:
+                    message = make_message(length, fields, position,
+                                           separator)
+                    record = logging.LogRecord(
+                        'user_data', logging.INFO, None, None, message,
+                        None, None)
+                    params = {'length': len(message), 'fields': count,
+                              'position': position,
+                              'separator': separator}
+                    results.append(dict(
+                        name='filter_datum', params=params,
+                        **measure(lambda: filter_datum(
+                            fields, '***', message, separator),
+                            iterations)))
+                    if separator != formatter.SEPARATOR:
+                        continue
+                    results.append(dict(
+                        name='RedactingFormatter.format', params=params,
+                        **measure(lambda: formatter.format(record),
+                                  iterations)))
+    return results
+
+
+def bench_hashing(costs: List[int], iterations: int) -> List[dict]:
+    """ Benchmarks hash_password and is_valid at each bcrypt cost
+    """
+    results = []
+    saved = encrypt_password.ROUNDS
+    try:
+        for cost in costs:
+            encrypt_password.ROUNDS = cost
+            hashed = encrypt_password.hash_password('benchmark')
+            params = {'cost': cost}
+            results.append(dict(
+                name='hash_password', params=params,
+                **measure(lambda: encrypt_password.hash_password(
+                    'benchmark'), iterations, warmup=1)))
+            results.append(dict(
+                name='is_valid', params=params,
+                **measure(lambda: encrypt_password.is_valid(
+                    hashed, 'benchmark'), iterations, warmup=1)))
+    finally:
+        encrypt_password.ROUNDS = saved
+    return results
+
+
+def main() -> None:
+    """ Command line entry point
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the redaction and hashing primitives")
+    parser.add_argument('--iterations', type=int, default=1000,
+                        help="timed calls per redaction case")
+    parser.add_argument('--hash-iterations', type=int, default=10,
+                        help="timed calls per bcrypt cost")
+    parser.add_argument('--costs', type=int, nargs='+', default=COSTS,
+                        help="bcrypt cost factors")
+    parser.add_argument('--skip-hashing', action='store_true',
+                        help="only benchmark the redaction primitives")
+    parser.add_argument('--output', default=None,
+                        help="file receiving the JSON, defaults to stdout")
+    args = parser.parse_args()
+
+    results = bench_redaction(args.iterations)
+    if not args.skip_hashing:
+        results += bench_hashing(args.costs, args.hash_iterations)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
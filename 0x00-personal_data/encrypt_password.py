@@ -1,9 +1,26 @@
 #!/usr/bin/env python3
 """ Encrypt password using the bcrypt module
+    bcrypt releases the GIL while hashing, so batches of passwords are
+    spread over a thread pool and the async variants run on the event
+    loop's default executor
+    The cost factor defaults to BCRYPT_ROUNDS (or bcrypt's 12) and can be
+    calibrated against the machine with calibrate_rounds, hashes using
+    another cost are reported by is_valid_with_rehash so they can be
+    rehashed on a successful login
 """
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+import time
+from typing import Iterable, List, Tuple
 import bcrypt
 
 
+ROUNDS = int(getenv('BCRYPT_ROUNDS', 12))
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+
+
 def hash_password(password: str) -> bytes:
     """ Encrypts a password using bcrypt
         Args:
@@ -11,7 +28,7 @@ def hash_password(password: str) -> bytes:
         Returns:
             a bytes object containing the encrypted password
     """
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(ROUNDS))
 
 
 def is_valid(hashed_password: bytes, password: str) -> bool:
@@ -23,3 +40,120 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
             a boolean value indicating if the password is valid
     """
     return bcrypt.checkpw(password.encode(), hashed_password)
+
+
+def get_rounds(hashed_password: bytes) -> int:
+    """ Returns the cost factor of a bcrypt hash
+        Args:
+            hashed_password: a bytes object such as b'$2b$12$...'
+        Returns:
+            the cost factor the hash was computed with
+    """
+    return int(hashed_password.split(b'$')[2])
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """ Check if a hash was computed with another cost than ROUNDS
+    """
+    return get_rounds(hashed_password) != ROUNDS
+
+
+def is_valid_with_rehash(hashed_password: bytes,
+                         password: str) -> Tuple[bool, bool]:
+    """ Check if the password is valid and if its hash is outdated
+        Args:
+            hashed_password: a bytes object containing the encrypted password
+            password: a string to be checked
+        Returns:
+            a tuple (valid, rehash), rehash is only True for a valid
+            password whose hash does not use the current cost factor
+    """
+    valid = is_valid(hashed_password, password)
+    return valid, valid and needs_rehash(hashed_password)
+
+
+def calibrate_rounds(target_ms: float = 50.0, samples: int = 3) -> int:
+    """ Benchmarks bcrypt and sets ROUNDS to the highest cost factor
+        whose verification takes no more than target_ms on this machine
+        Each extra round doubles the cost, so the search stops at the
+        first cost factor above the target
+        Args:
+            target_ms: the target verification latency in milliseconds
+            samples: number of timed verifications per cost factor
+        Returns:
+            the chosen cost factor, never lower than MIN_ROUNDS
+    """
+    global ROUNDS
+    password = b'calibration'
+    chosen = MIN_ROUNDS
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            bcrypt.checkpw(password, hashed)
+            timings.append((time.perf_counter() - started) * 1000)
+        if sorted(timings)[len(timings) // 2] > target_ms:
+            break
+        chosen = rounds
+    ROUNDS = chosen
+    return ROUNDS
+
+
+def hash_passwords(passwords: Iterable[str],
+                   workers: int = None) -> List[bytes]:
+    """ Encrypts many passwords concurrently
+        Args:
+            passwords: the strings to be encrypted
+            workers: number of threads, defaults to the executor default
+        Returns:
+            a list of the encrypted passwords, in the input order
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hash_password, passwords))
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]],
+                workers: int = None) -> List[bool]:
+    """ Checks many (hashed_password, password) pairs concurrently
+        Args:
+            pairs: the encrypted passwords and the strings to be checked
+            workers: number of threads, defaults to the executor default
+        Returns:
+            a list of booleans, in the input order
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda pair: is_valid(*pair), pairs))
+
+
+async def async_hash_password(password: str) -> bytes:
+    """ Awaitable hash_password, run in the default executor
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, hash_password, password)
+
+
+async def async_is_valid(hashed_password: bytes, password: str) -> bool:
+    """ Awaitable is_valid, run in the default executor
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, is_valid, hashed_password, password)
+
+
+async def async_hash_passwords(passwords: Iterable[str],
+                               workers: int = None) -> List[bytes]:
+    """ Awaitable hash_passwords
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, hash_passwords, list(passwords), workers)
+
+
+async def async_verify_many(pairs: Iterable[Tuple[bytes, str]],
+                            workers: int = None) -> List[bool]:
+    """ Awaitable verify_many
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, verify_many, list(pairs), workers)
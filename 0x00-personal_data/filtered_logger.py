@@ -7,15 +7,97 @@
     eg.
         message = re.sub(rf'{field}=.*?(?={separator})',
                           f'{field}={redaction}', message)
+    All fields are compiled into a single alternation so a message
+    is redacted in one scan, eg. for the fields name and email:
+        (name|email)=.+?;
 """
+import atexit
+from collections.abc import Mapping
+from contextlib import contextmanager
+from copy import copy
+from functools import lru_cache
 import logging
+from logging.handlers import QueueHandler, QueueListener
 import mysql.connector
-from os import getenv
+import mysql.connector.pooling
+from os import getenv, path, remove
+from queue import Empty, Full, Queue
 import re
-from typing import List
+from threading import Event, Lock
+from typing import Iterator, List, Tuple
 
 
 PII_FIELDS = ('name', 'email', 'phone', 'ssn', 'password')
+IDENTIFIER = re.compile(r'^\w+$')
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_newest')
+_db_pool = None
+_db_pool_lock = Lock()
+
+
+class RedactionEngine:
+    """ Redacts a set of fields from a message in a single regex pass
+        The fields and the separator are compiled once into one
+        alternation pattern that is reused for every message
+        Messages containing none of the field= tokens are returned
+        untouched without running the regex; hits counts the messages
+        that went through the regex and misses the ones that did not
+    """
+
+    def __init__(self, fields: Tuple[str, ...], redaction: str,
+                 separator: str):
+        """ Constructor compiling the redaction pattern
+            Args:
+                fields (Tuple[str, ...]): the fields to obfuscate
+                redaction (str): representing the obfuscated string
+                separator (str): representing the separator for the fields
+        """
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self.tokens = tuple("{}=".format(field) for field in self.fields)
+        self.hits = 0
+        self.misses = 0
+        self.pattern = re.compile(r'({})=.+?{}'.format(
+            '|'.join(re.escape(field) for field in self.fields),
+            re.escape(separator)))
+        self.replacement = r'\g<1>={}{}'.format(
+            redaction.replace('\\', r'\\'),
+            separator.replace('\\', r'\\'))
+
+    def redact(self, message: str) -> str:
+        """ Returns the message with every field value obfuscated
+            Args:
+                message (str): representing the log line
+            Returns:
+                str: the log message obfuscated
+        """
+        for token in self.tokens:
+            if token in message:
+                break
+        else:
+            self.misses += 1
+            return message
+        self.hits += 1
+        return self.pattern.sub(self.replacement, message)
+
+    def stats(self) -> dict:
+        """ Returns the pre-check hit and miss counters
+        """
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+@lru_cache(maxsize=128)
+def get_redaction_engine(fields: Tuple[str, ...], redaction: str,
+                         separator: str) -> RedactionEngine:
+    """ Returns a cached RedactionEngine for the given arguments
+        Args:
+            fields (Tuple[str, ...]): the fields to obfuscate
+            redaction (str): representing the obfuscated string
+            separator (str): representing the separator for the fields
+        Returns:
+            RedactionEngine: the compiled engine
+    """
+    return RedactionEngine(fields, redaction, separator)
 
 
 def filter_datum(
@@ -30,25 +112,83 @@ def filter_datum(
         Returns:
             str: the log message obfuscated
     """
-    for field in fields:
-        message = re.sub(rf'{field}=.+?{separator}',
-                         f'{field}={redaction}{separator}', message)
-    return message
+    return get_redaction_engine(
+        tuple(fields), redaction, separator).redact(message)
 
 
 class RedactingFormatter(logging.Formatter):
     """ Redacting Formatter class
+        In structured mode, records logged with a mapping, either as the
+        message itself or as its arguments, have their PII keys masked
+        directly on the mapping and are rendered without any regex pass
+        eg.
+            logger.info({'name': 'Bob', 'ip': '127.0.0.1'})
+            logger.info('user %(name)s from %(ip)s', row)
     """
 
     REDACTION = "***"
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], structured: bool = False):
         """ Constructor for obfuscating PII in log messages
+            Args:
+                fields (List[str]): the fields to obfuscate
+                structured (bool): mask mapping records by key
         """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.structured = structured
+        self.field_set = frozenset(fields)
+        self.engine = RedactionEngine(
+            tuple(fields), self.REDACTION, self.SEPARATOR)
+
+    def mask(self, data: Mapping) -> dict:
+        """ Returns a copy of data with the values of PII keys obfuscated
+            Args:
+                data (Mapping): the structured log data
+            Returns:
+                dict: the masked data
+        """
+        return {key: self.REDACTION if key in self.field_set else value
+                for key, value in data.items()}
+
+    def render(self, data: Mapping) -> str:
+        """ Renders masked structured data as key=value pairs
+            Args:
+                data (Mapping): the structured log data
+            Returns:
+                str: the pairs, each one terminated by the separator
+        """
+        return " ".join("{}={}{}".format(
+            key, self.REDACTION if key in self.field_set else value,
+            self.SEPARATOR) for key, value in data.items())
+
+    def format_structured(self, record: logging.LogRecord) -> str:
+        """ Formats a record carrying a mapping without a regex pass
+            Args:
+                record (logging.LogRecord): the record to format
+            Returns:
+                str: the log message obfuscated, None if the record
+                    does not carry structured data
+        """
+        if isinstance(record.msg, Mapping):
+            message = self.render(record.msg)
+        elif isinstance(record.args, Mapping):
+            if record.msg:
+                message = str(record.msg) % self.mask(record.args)
+            else:
+                message = self.render(record.args)
+        else:
+            return None
+        record = copy(record)
+        record.msg, record.args = message, None
+        return super().format(record)
+
+    def stats(self) -> dict:
+        """ Returns how many messages needed the regex redaction pass
+        """
+        return self.engine.stats()
 
     def format(self, record: logging.LogRecord) -> str:
         """ format method that filters values in incoming log records
@@ -57,53 +197,341 @@ class RedactingFormatter(logging.Formatter):
             Returns:
                 str: the log message obfuscated
         """
-        return filter_datum(self.fields, self.REDACTION,
-                            super().format(record), self.SEPARATOR)
+        if self.structured:
+            message = self.format_structured(record)
+            if message is not None:
+                return message
+        return self.engine.redact(super().format(record))
+
+
+class BoundedQueueHandler(QueueHandler):
+    """ QueueHandler over a bounded queue with an overflow policy
+        Records are enqueued as they are, formatting and redaction are
+        left to the handlers of the listener thread
+        Policies when the queue is full:
+            - block: wait for room in the queue
+            - drop_oldest: discard the oldest queued record
+            - drop_newest: discard the incoming record
+        Every discarded record is counted in dropped
+        Once its listener is stopping, records are handled right away
+        by the listener handlers instead, so logging never blocks on a
+        queue nobody drains
+    """
+
+    def __init__(self, queue: Queue, overflow: str = 'block'):
+        """ Constructor
+            Args:
+                queue (Queue): the bounded queue shared with the listener
+                overflow (str): one of OVERFLOW_POLICIES
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy: {}".format(overflow))
+        super().__init__(queue)
+        self.overflow = overflow
+        self.dropped = 0
+        self.listener = None
+
+    def stopped(self) -> bool:
+        """ Tells if the listener is stopping or stopped
+        """
+        return self.listener is not None and self.listener.stopping.is_set()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """ Returns the record untouched so it is formatted off-thread
+        """
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        """ Enqueues a record according to the overflow policy
+        """
+        if self.stopped():
+            self.listener.handle(record)
+            return
+        if self.overflow == 'block':
+            while True:
+                try:
+                    self.queue.put(record, True,
+                                   BoundedQueueListener.POLL_INTERVAL)
+                    return
+                except Full:
+                    if self.stopped():
+                        self.listener.handle(record)
+                        return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except Full:
+                if self.overflow == 'drop_newest':
+                    self.dropped += 1
+                    return
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except Empty:
+                pass
 
 
-def get_logger() -> logging.Logger:
+class BoundedQueueListener(QueueListener):
+    """ QueueListener that can be stopped whatever the queue holds
+        stop also sets the stopping event, after which the listener
+        handles at most the records queued when stop was called and
+        exits, even if the sentinel was dropped from a full queue, could
+        not be enqueued or sits behind records logged meanwhile; records
+        still queued once it exited are handled by stop
+        Stopping twice does nothing
+    """
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, queue: Queue, *handlers: logging.Handler,
+                 respect_handler_level: bool = False):
+        """ Constructor
+        """
+        super().__init__(queue, *handlers,
+                         respect_handler_level=respect_handler_level)
+        self.stopping = Event()
+        self.stop_lock = Lock()
+        self.remaining = 0
+
+    def start(self):
+        """ Starts the listener thread
+        """
+        self.stopping.clear()
+        super().start()
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        """ Returns the next record, or the sentinel once the listener is
+            stopping and handled the records queued before stop
+        """
+        if not block:
+            return self.queue.get(False)
+        while True:
+            if self.stopping.is_set():
+                if self.remaining <= 0:
+                    return self._sentinel
+                self.remaining -= 1
+            try:
+                return self.queue.get(True, self.POLL_INTERVAL)
+            except Empty:
+                if self.stopping.is_set():
+                    return self._sentinel
+
+    def enqueue_sentinel(self):
+        """ Enqueues the sentinel if the queue has room, the stopping
+            event ends the listener otherwise
+        """
+        try:
+            self.queue.put_nowait(self._sentinel)
+        except Full:
+            pass
+
+    def stop(self):
+        """ Stops the listener after it drained the queue, if running
+        """
+        with self.stop_lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self.remaining = self.queue.qsize()
+            self.stopping.set()
+            self.enqueue_sentinel()
+            thread.join()
+            self._thread = None
+            while True:
+                try:
+                    record = self.queue.get_nowait()
+                except Empty:
+                    break
+                if record is not self._sentinel:
+                    self.handle(record)
+
+
+def get_logger(structured: bool = False, queued: bool = False,
+               queue_size: int = 10000,
+               overflow: str = 'block') -> logging.Logger:
     """ Returns a logging object
         logger is named user_data and has a log level of INFO
         It should not propagate messages to other loggers
         It has a StreamHandler with RedactingFormatter as formatter
+        When queued, the logger only enqueues records to a bounded queue
+        and the StreamHandler runs on a background listener thread, which
+        is stopped, after draining the queue, when the interpreter exits;
+        the queue and listener are installed once and reused by later
+        calls while the listener runs
+        Args:
+            structured (bool): mask mapping records by key, see
+                RedactingFormatter
+            queued (bool): format and write records on a background thread
+            queue_size (int): maximum number of pending records
+            overflow (str): policy when the queue is full, see
+                BoundedQueueHandler
         Returns:
             logging.Logger: the user_data logger
     """
     logger = logging.getLogger('user_data')
     logger.setLevel(logging.INFO)
     logger.propagate = False
+    if queued:
+        for handler in list(logger.handlers):
+            if isinstance(handler, BoundedQueueHandler):
+                if not handler.stopped():
+                    return logger
+                logger.removeHandler(handler)
     stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(RedactingFormatter(list(PII_FIELDS)))
-    logger.addHandler(stream_handler)
+    stream_handler.setFormatter(
+        RedactingFormatter(list(PII_FIELDS), structured=structured))
+    if not queued:
+        logger.addHandler(stream_handler)
+        return logger
+    queue = Queue(queue_size)
+    queue_handler = BoundedQueueHandler(queue, overflow)
+    queue_handler.listener = BoundedQueueListener(queue, stream_handler)
+    queue_handler.listener.start()
+    atexit.register(queue_handler.listener.stop)
+    logger.addHandler(queue_handler)
     return logger
 
 
+def db_config() -> dict:
+    """ Returns the connection settings read from the environment
+    """
+    return {
+        'user': getenv('PERSONAL_DATA_DB_USERNAME', 'root'),
+        'password': getenv('PERSONAL_DATA_DB_PASSWORD', ''),
+        'host': getenv('PERSONAL_DATA_DB_HOST', 'localhost'),
+        'database': getenv('PERSONAL_DATA_DB_NAME')
+    }
+
+
 def get_db() -> mysql.connector.connection.MySQLConnection:
     """ Returns a connector to the database
     """
-    return mysql.connector.connect(
-        user=getenv('PERSONAL_DATA_DB_USERNAME', 'root'),
-        password=getenv('PERSONAL_DATA_DB_PASSWORD', ''),
-        host=getenv('PERSONAL_DATA_DB_HOST', 'localhost'),
-        database=getenv('PERSONAL_DATA_DB_NAME')
-    )
+    return mysql.connector.connect(**db_config())
+
+
+def get_db_pool() -> mysql.connector.pooling.MySQLConnectionPool:
+    """ Returns the process wide connection pool, created on first use
+        Its size is PERSONAL_DATA_DB_POOL_SIZE (default 5, at most 32)
+        and its name PERSONAL_DATA_DB_POOL_NAME (default personal_data)
+    """
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = mysql.connector.pooling.MySQLConnectionPool(
+                pool_name=getenv('PERSONAL_DATA_DB_POOL_NAME',
+                                 'personal_data'),
+                pool_size=int(getenv('PERSONAL_DATA_DB_POOL_SIZE', 5)),
+                **db_config())
+        return _db_pool
+
+
+@contextmanager
+def pooled_db() -> Iterator[mysql.connector.pooling.PooledMySQLConnection]:
+    """ Checks a healthy connection out of the pool for a with block
+        The connection is pinged, and reconnected if the server dropped
+        it, before being handed out; closing it returns it to the pool
+        eg.
+            with pooled_db() as db:
+                cursor = db.cursor()
+    """
+    db = get_db_pool().get_connection()
+    try:
+        db.ping(reconnect=True, attempts=3, delay=1)
+        yield db
+    finally:
+        db.close()
+
+
+def quote_identifier(name: str) -> str:
+    """ Returns a table or column name quoted for a MySQL statement
+        Args:
+            name (str): the identifier, letters, digits and underscores only
+        Returns:
+            str: the quoted identifier
+    """
+    if not isinstance(name, str) or not IDENTIFIER.match(name):
+        raise ValueError("Invalid identifier: {!r}".format(name))
+    return "`{}`".format(name)
+
+
+def stream_rows(
+        db: mysql.connector.connection.MySQLConnection, table: str,
+        batch_size: int = 1000, key: str = None, after=None
+        ) -> Iterator[List[dict]]:
+    """ Yields the rows of a table in batches of at most batch_size rows
+        Only one batch is held in memory at a time
+        Without a key, a single unbuffered query is read with fetchmany
+        With a key, rows are paginated on that (unique, indexed) column
+        so an interrupted export can resume after the last key seen
+        Args:
+            db: the database connection
+            table (str): the table to export
+            batch_size (int): the maximum number of rows per batch
+            key (str): the column used for keyset pagination
+            after: only rows whose key is greater than after are returned
+        Returns:
+            Iterator[List[dict]]: the batches of rows
+    """
+    table = quote_identifier(table)
+    cursor = db.cursor(dictionary=True, buffered=False)
+    try:
+        if key is None:
+            cursor.execute("SELECT * FROM {};".format(table))
+            batch = cursor.fetchmany(batch_size)
+            while batch:
+                yield batch
+                batch = cursor.fetchmany(batch_size)
+            return
+        column = quote_identifier(key)
+        while True:
+            if after is None:
+                cursor.execute("SELECT * FROM {} ORDER BY {} LIMIT %s;"
+                               .format(table, column), (batch_size,))
+            else:
+                cursor.execute(
+                    "SELECT * FROM {} WHERE {} > %s ORDER BY {} LIMIT %s;"
+                    .format(table, column, column), (after, batch_size))
+            batch = cursor.fetchall()
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            after = batch[-1][key]
+    finally:
+        cursor.close()
 
 
 def main() -> None:
     """ Main function
         Connects to the database and retrieves all rows from the users table
         Logs each row in the users table in a specific format
+        Rows are streamed in batches of PERSONAL_DATA_EXPORT_BATCH rows
+        When PERSONAL_DATA_EXPORT_KEY names a unique column, rows are
+        paginated on it and, if PERSONAL_DATA_EXPORT_CHECKPOINT is set,
+        the last exported key is saved to that file after every batch
+        so a restarted export resumes where it stopped; the checkpoint
+        is removed once the export completes
     """
+    batch_size = int(getenv('PERSONAL_DATA_EXPORT_BATCH', 1000))
+    key = getenv('PERSONAL_DATA_EXPORT_KEY') or None
+    checkpoint = getenv('PERSONAL_DATA_EXPORT_CHECKPOINT') or None
+    after = None
+    if key and checkpoint and path.exists(checkpoint):
+        with open(checkpoint, 'r') as f:
+            after = f.read().strip() or None
+
     db = get_db()
-    cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users;")
-    logger = get_logger()
-    for row in cursor:
-        logger.info(
-                "; ".join([f"{key}={value}" for key, value in row.items()])
-                )
-
-    cursor.close()
+    logger = get_logger(structured=True)
+    for batch in stream_rows(db, 'users', batch_size, key, after):
+        for row in batch:
+            logger.info(row)
+        if key and checkpoint:
+            with open(checkpoint, 'w') as f:
+                f.write(str(batch[-1][key]))
+
+    if key and checkpoint and path.exists(checkpoint):
+        remove(checkpoint)
     db.close()
 
 
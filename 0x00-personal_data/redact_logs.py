@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+""" Bulk redaction of existing log files
+    Applies the filter_datum obfuscation to every line of a file
+    The input is memory mapped and split on line boundaries into chunks
+    that are redacted by a pool of processes, the redacted chunks are
+    written to the output in their original order
+    At most two chunks per worker are in flight so memory stays bounded
+    eg.
+        ./redact_logs.py old.log old.redacted.log --workers 8
+"""
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import mmap
+import os
+import sys
+import time
+from typing import BinaryIO, Iterator, List, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter, filter_datum
+
+
+CHUNK_SIZE = 16 * 1024 * 1024
+ENCODING = 'utf-8'
+
+
+def chunk_bounds(mapped: mmap.mmap, chunk_size: int
+                 ) -> Iterator[Tuple[int, int]]:
+    """ Yields (start, end) offsets of chunks ending on a line boundary
+        Args:
+            mapped (mmap.mmap): the mapped input file
+            chunk_size (int): the approximate size of a chunk in bytes
+        Returns:
+            Iterator[Tuple[int, int]]: the chunk offsets
+    """
+    size = len(mapped)
+    start = 0
+    while start < size:
+        end = mapped.find(b'\n', min(start + chunk_size, size) - 1)
+        end = size if end == -1 else end + 1
+        yield start, end
+        start = end
+
+
+def redact_chunk(file_path: str, start: int, end: int, fields: List[str],
+                 redaction: str, separator: str) -> Tuple[bytes, int]:
+    """ Redacts the bytes of file_path between start and end
+        Args:
+            file_path (str): the input file
+            start (int): offset of the first byte of the chunk
+            end (int): offset past the last byte of the chunk
+            fields (List[str]): the fields to obfuscate
+            redaction (str): representing the obfuscated string
+            separator (str): representing the separator for the fields
+        Returns:
+            Tuple[bytes, int]: the redacted chunk and its number of lines
+    """
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = mapped[start:end]
+    text = data.decode(ENCODING, 'surrogateescape')
+    text = filter_datum(fields, redaction, text, separator)
+    return text.encode(ENCODING, 'surrogateescape'), data.count(b'\n')
+
+
+def redact_file(input_path: str, output_path: str, fields: List[str],
+                redaction: str, separator: str, workers: int = None,
+                chunk_size: int = CHUNK_SIZE) -> Tuple[int, int]:
+    """ Redacts input_path into output_path with a pool of processes
+        The output is written to output_path.tmp then moved into place,
+        so output_path may be input_path itself
+        Args:
+            input_path (str): the log file to redact
+            output_path (str): the file receiving the redacted lines
+            fields (List[str]): the fields to obfuscate
+            redaction (str): representing the obfuscated string
+            separator (str): representing the separator for the fields
+            workers (int): number of processes, defaults to the CPU count
+            chunk_size (int): the approximate size of a chunk in bytes
+        Returns:
+            Tuple[int, int]: the number of bytes and lines read
+    """
+    size = os.path.getsize(input_path)
+    lines = 0
+    tmp_path = output_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as out:
+            if size > 0:
+                lines = _redact_into(out, input_path, fields, redaction,
+                                     separator, workers, chunk_size)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size, lines
+
+
+def _redact_into(out: BinaryIO, input_path: str, fields: List[str],
+                 redaction: str, separator: str, workers: int,
+                 chunk_size: int) -> int:
+    """ Writes the redacted chunks of a non empty input_path to out
+        Returns:
+            int: the number of lines read
+    """
+    lines = 0
+    with open(input_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            bounds = list(chunk_bounds(mapped, chunk_size))
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for start, end in bounds:
+            if len(pending) >= 2 * workers:
+                data, count = pending.popleft().result()
+                out.write(data)
+                lines += count
+            pending.append(pool.submit(
+                redact_chunk, input_path, start, end, fields,
+                redaction, separator))
+        while pending:
+            data, count = pending.popleft().result()
+            out.write(data)
+            lines += count
+    return lines
+
+
+def main() -> None:
+    """ Command line entry point
+    """
+    parser = argparse.ArgumentParser(
+        description="Redact PII fields from existing log files")
+    parser.add_argument('input', help="log file to redact")
+    parser.add_argument('output', help="file receiving the redacted log")
+    parser.add_argument('--fields', nargs='+', default=list(PII_FIELDS),
+                        help="fields to obfuscate")
+    parser.add_argument('--redaction', default=RedactingFormatter.REDACTION,
+                        help="obfuscated string")
+    parser.add_argument('--separator', default=RedactingFormatter.SEPARATOR,
+                        help="separator for the fields")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of processes, defaults to CPU count")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help="approximate chunk size in bytes")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    size, lines = redact_file(args.input, args.output, args.fields,
+                              args.redaction, args.separator,
+                              args.workers, args.chunk_size)
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print("{} bytes, {} lines in {:.3f}s: {:.2f} MB/s, {:.0f} lines/s"
+          .format(size, lines, elapsed, size / elapsed / 1e6,
+                  lines / elapsed), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
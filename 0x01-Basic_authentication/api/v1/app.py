@@ -6,7 +6,9 @@ from os import getenv
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
+from models.base import LOAD_STATS, describe_load
 import os
+import sys
 
 
 app = Flask(__name__)
@@ -14,6 +16,13 @@ app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
 auth_type = getenv('AUTH_TYPE')
+for s_class in LOAD_STATS:
+    print(describe_load(s_class), file=sys.stderr)
+AUTH_PATHS = (
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+)
 
 
 if auth_type:
@@ -22,6 +31,7 @@ if auth_type:
     authentification = {'basic_auth': BasicAuth, 'auth': Auth}
     if auth_type in authentification:
         auth = authentification[auth_type]()
+        auth.path_matcher(AUTH_PATHS)
 
 
 @app.errorhandler(404)
@@ -52,11 +62,7 @@ def before_request():
     """
     if not auth:
         return
-    auth_paths = [
-            '/api/v1/status/',
-            '/api/v1/unauthorized/',
-            '/api/v1/forbidden/']
-    if not auth.require_auth(request.path, auth_paths):
+    if not auth.require_auth(request.path, AUTH_PATHS):
         return
     if not auth.authorization_header(request):
         abort(401)
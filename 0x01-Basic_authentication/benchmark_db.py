@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+""" Benchmarks of the JSON and binary snapshot formats
+    Times User.save_to_file and User.load_from_file for each format
+    over a number of users, in a temporary directory, and prints the
+    results as JSON with the best and mean times in seconds
+    read_snapshot times the decoding of the file alone, load_from_file
+    also builds and indexes the objects
+    The other DB_* settings, such as DB_LAZY_LOAD, apply as usual
+    eg.
+        ./benchmark_db.py --sizes 10000 100000 --output bench_db.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, List
+
+from models import binary_format
+import models.base
+from models.base import DATA
+from models.user import User
+
+
+SIZES = (10000, 100000, 1000000)
+FORMATS = ('json', 'binary')
+
+
+def measure(func: Callable[[], object], repeat: int) -> dict:
+    """ Times func and summarizes its durations
+        Args:
+            func: the callable to time, called without arguments
+            repeat: number of timed calls
+        Returns:
+            dict: best and mean durations in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return {'repeat': repeat, 'best_s': min(timings),
+            'mean_s': sum(timings) / repeat}
+
+
+def make_users(size: int) -> dict:
+    """ Builds size users by id, their password hash being a fixed one
+        Their serialization is cached beforehand, like after a first save
+    """
+    users = {}
+    for i in range(size):
+        user = User(email="user{}@example.com".format(i),
+                    _password='{:064x}'.format(i),
+                    first_name="First{}".format(i) if i % 2 else None,
+                    last_name="Last{}".format(i))
+        user.serialized()
+        users[user.id] = user
+    return users
+
+
+def read_snapshot() -> dict:
+    """ Reads the User snapshot into JSON dictionaries, without building
+        the objects as load_from_file does
+    """
+    if models.base.BINARY:
+        with open(User.snapshot_path(), 'rb') as f:
+            return binary_format.load(f, 'User', User.SCHEMA)
+    with open(User.snapshot_path(), 'r') as f:
+        return json.load(f)
+
+
+def bench_formats(sizes: List[int], repeat: int) -> List[dict]:
+    """ Benchmarks save_to_file, read_snapshot and load_from_file in
+        each format
+    """
+    results = []
+    saved = models.base.BINARY
+    try:
+        for size in sizes:
+            users = make_users(size)
+            for name in FORMATS:
+                models.base.BINARY = name == 'binary'
+                DATA['User'] = dict(users)
+                params = {'format': name, 'objects': size}
+                results.append(dict(
+                    name='save_to_file', params=params,
+                    **measure(User.save_to_file, repeat)))
+                results[-1]['bytes'] = os.path.getsize(User.snapshot_path())
+                results.append(dict(
+                    name='read_snapshot', params=params,
+                    **measure(read_snapshot, repeat)))
+                results.append(dict(
+                    name='load_from_file', params=params,
+                    **measure(User.load_from_file, repeat)))
+                os.remove(User.snapshot_path())
+            DATA['User'] = {}
+    finally:
+        models.base.BINARY = saved
+    return results
+
+
+def main() -> None:
+    """ Command line entry point
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the JSON and binary snapshot formats")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help="numbers of users")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="timed calls per case")
+    parser.add_argument('--output', default=None,
+                        help="file receiving the JSON, defaults to stdout")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            results = bench_formats(args.sizes, args.repeat)
+        finally:
+            os.chdir(cwd)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'journal': models.base.JOURNAL,
+            'lazy_load': models.base.LAZY_LOAD,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,378 @@
 #!/usr/bin/env python3
 """ Base module
 """
+import atexit
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import MutableMapping
 from datetime import datetime
 from typing import TypeVar, List, Iterable
-from os import path
+from os import getenv, path, remove, replace, stat
+import os
 import json
+import logging
+import threading
+import time
 import uuid
 
+from models import binary_format
+
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+SORTED_IDS = {}
+LOCKS = {}
+FILE_LOCKS = {}
+JOURNAL = getenv('DB_JOURNAL', '').lower() in ('1', 'true', 'yes')
+JOURNAL_COMPACT = int(getenv('DB_JOURNAL_COMPACT', 1000))
+JOURNAL_SIZES = {}
+WRITE_BEHIND_MS = int(getenv('DB_WRITE_BEHIND_MS', 0))
+WRITE_BEHIND_CHANGES = int(getenv('DB_WRITE_BEHIND_CHANGES', 100))
+PENDING = {}
+_pending_count = 0
+_pending_changed = threading.Condition()
+_flusher = None
+LAZY_LOAD = getenv('DB_LAZY_LOAD', '').lower() in ('1', 'true', 'yes')
+LOAD_STATS = {}
+FORMATS = ('json', 'binary')
+FORMAT = getenv('DB_FORMAT', 'json').lower()
+if FORMAT not in FORMATS:
+    raise ValueError("Unknown DB_FORMAT: {}".format(FORMAT))
+BINARY = FORMAT == 'binary'
+STORAGES = ('json', 'sqlite')
+STORAGE = getenv('DB_STORAGE', 'json')
+if STORAGE not in STORAGES:
+    raise ValueError("Unknown DB_STORAGE engine: {}".format(STORAGE))
+SQLITE_PATH = getenv('DB_SQLITE_PATH', '.db.sqlite3')
+_storage = None
+_storage_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+def storage():
+    """ Return the storage engine selected by DB_STORAGE, None for the
+        default json engine implemented by Base itself
+    """
+    global _storage
+    if STORAGE == 'sqlite' and _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                from models.sqlite_storage import SQLiteStorage
+                _storage = SQLiteStorage(SQLITE_PATH)
+    return _storage
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string, much faster than strptime
+    """
+    return datetime.fromisoformat(value)
+
+
+def flush():
+    """ Persist every change deferred by the write-behind mode
+        Each class is written once, whatever its number of changes
+    """
+    with _pending_changed:
+        classes = [cls for cls, records, count in PENDING.values()]
+    for cls in classes:
+        cls.flush_changes()
+
+
+def describe_load(s_class: str) -> str:
+    """ Describe the last load_from_file of a class, from LOAD_STATS
+    """
+    stats = LOAD_STATS[s_class]
+    return "Loaded {} {} objects in {:.3f}s{}".format(
+        stats['objects'], s_class, stats['seconds'],
+        " (lazy)" if stats['lazy'] else "")
+
+
+def _flush_loop():
+    """ Body of the write-behind thread: flush every DB_WRITE_BEHIND_MS
+        milliseconds, or as soon as DB_WRITE_BEHIND_CHANGES are pending
+        A failed flush is logged and retried after DB_WRITE_BEHIND_MS,
+        its changes being queued again by flush_changes
+    """
+    while True:
+        with _pending_changed:
+            _pending_changed.wait_for(
+                lambda: _pending_count >= WRITE_BEHIND_CHANGES,
+                WRITE_BEHIND_MS / 1000)
+        try:
+            flush()
+        except Exception:
+            logger.exception("Write-behind flush failed, retrying")
+            time.sleep(WRITE_BEHIND_MS / 1000)
+
+
+def fsync_path(file_path: str):
+    """ Flush a file or directory to disk, if it exists
+    """
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class Index():
+    """ Secondary index of the objects of a class on one attribute
+        Maps each value of the attribute to the ids of the objects
+        holding it, unhashable values are not indexed
+    """
+
+    def __init__(self, attribute: str):
+        """ Initialize an empty Index
+        """
+        self.attribute = attribute
+        self.ids_by_value = {}
+        self.value_by_id = {}
+
+    def add(self, obj_id: str, value):
+        """ Index an object id under value
+        """
+        self.discard(obj_id)
+        try:
+            ids = self.ids_by_value.setdefault(value, {})
+        except TypeError:
+            return
+        ids[obj_id] = None
+        self.value_by_id[obj_id] = value
+
+    def discard(self, obj_id: str):
+        """ Remove an object id from the index
+        """
+        if obj_id not in self.value_by_id:
+            return
+        value = self.value_by_id.pop(obj_id)
+        ids = self.ids_by_value[value]
+        del ids[obj_id]
+        if len(ids) == 0:
+            del self.ids_by_value[value]
+
+    def lookup(self, value) -> List[str]:
+        """ Return the ids of the objects indexed under value
+        """
+        return list(self.ids_by_value.get(value, ()))
+
+
+class _Guard():
+    """ Context manager calling enter and exit, cheaper than one built
+        by contextmanager for every with block
+    """
+    __slots__ = ('enter', 'exit')
+
+    def __init__(self, enter, exit):
+        """ Initialize with the functions called by __enter__ and __exit__
+        """
+        self.enter = enter
+        self.exit = exit
+
+    def __enter__(self):
+        """ Call enter
+        """
+        self.enter()
+
+    def __exit__(self, *exc_info):
+        """ Call exit
+        """
+        self.exit()
+
+
+class ReadWriteLock():
+    """ Lock shared by any number of readers or held by one writer
+        Waiting writers go first so a stream of readers cannot starve
+        them; a thread holding the lock may take it again to read, and
+        the writer may take it again to write
+        read and write return the same guard every time; it takes the
+        mutex of the condition directly and only waits on the condition
+        when the lock is not free
+    """
+
+    def __init__(self):
+        """ Initialize an unlocked ReadWriteLock
+        """
+        self.mutex = threading.Lock()
+        self.changed = threading.Condition(self.mutex)
+        self.readers = {}
+        self.writer = None
+        self.writes = 0
+        self.waiting_writers = 0
+        self.read_guard = _Guard(self.acquire_read, self.release_read)
+        self.write_guard = _Guard(self.acquire_write, self.release_write)
+
+    def read(self) -> _Guard:
+        """ Return the guard holding the lock shared in a with block
+        """
+        return self.read_guard
+
+    def write(self) -> _Guard:
+        """ Return the guard holding the lock exclusively in a with block
+        """
+        return self.write_guard
+
+    def can_read(self) -> bool:
+        """ Tell if a new reader may take the lock
+        """
+        return self.writer is None and self.waiting_writers == 0
+
+    def can_write(self) -> bool:
+        """ Tell if a new writer may take the lock
+        """
+        return self.writer is None and len(self.readers) == 0
+
+    def acquire_read(self):
+        """ Take the lock shared
+        """
+        me = threading.get_ident()
+        if self.writer == me:
+            return
+        with self.mutex:
+            count = self.readers.get(me)
+            if count is None:
+                if self.writer is not None or self.waiting_writers:
+                    self.changed.wait_for(self.can_read)
+                self.readers[me] = 1
+            else:
+                self.readers[me] = count + 1
+
+    def release_read(self):
+        """ Release the lock taken by acquire_read
+        """
+        me = threading.get_ident()
+        if self.writer == me:
+            return
+        with self.mutex:
+            count = self.readers[me] - 1
+            if count:
+                self.readers[me] = count
+                return
+            del self.readers[me]
+            if not self.readers and self.waiting_writers:
+                self.changed.notify_all()
+
+    def acquire_write(self):
+        """ Take the lock exclusively
+        """
+        me = threading.get_ident()
+        with self.changed:
+            if self.writer != me:
+                self.waiting_writers += 1
+                self.changed.wait_for(self.can_write)
+                self.waiting_writers -= 1
+                self.writer = me
+            self.writes += 1
+
+    def release_write(self):
+        """ Release the lock taken by acquire_write
+        """
+        with self.changed:
+            self.writes -= 1
+            if self.writes == 0:
+                self.writer = None
+                self.changed.notify_all()
+
+
+class LazyObjects(MutableMapping):
+    """ Objects of a class by id, built from their JSON on first access
+        Keeps the insertion order of the ids; values are either the
+        stored JSON dictionary or, once accessed, the object itself
+    """
+
+    def __init__(self, cls: type, objs_json: dict):
+        """ Initialize with the JSON dictionaries by id
+        """
+        self.cls = cls
+        self.entries = objs_json
+
+    def __getitem__(self, obj_id: str):
+        """ Return the object, building it if needed
+        """
+        obj = self.entries[obj_id]
+        if type(obj) is dict:
+            obj = self.entries[obj_id] = self.cls(**obj)
+        return obj
+
+    def __setitem__(self, obj_id: str, obj):
+        """ Store an object
+        """
+        self.entries[obj_id] = obj
+
+    def __delitem__(self, obj_id: str):
+        """ Remove an object
+        """
+        del self.entries[obj_id]
+
+    def __iter__(self):
+        """ Iterate over the ids
+        """
+        return iter(self.entries)
+
+    def __len__(self) -> int:
+        """ Number of objects, built or not
+        """
+        return len(self.entries)
+
+    def __contains__(self, obj_id: str) -> bool:
+        """ Tell if there is an object with this id, without building it
+        """
+        return obj_id in self.entries
+
+    def to_json(self) -> dict:
+        """ Return the serialized objects by id without building them
+        """
+        return {obj_id: obj if type(obj) is dict else obj.serialized()
+                for obj_id, obj in list(self.entries.items())}
 
 
 class Base():
     """ Base class
+        Subclasses list in INDEXED_ATTRIBUTES the attributes that search
+        looks up through a secondary index instead of a full scan
+        Objects are persisted to the .db_<Class>.json snapshot; with
+        DB_JOURNAL set, save and remove only append one record to the
+        .db_<Class>.journal file, which is replayed over the snapshot by
+        load_from_file and folded into it by save_to_file once it holds
+        DB_JOURNAL_COMPACT records
+        With DB_WRITE_BEHIND_MS set, changes are only queued and a
+        background thread persists them in groups, see flush and sync
+        With DB_LAZY_LOAD set, load_from_file only indexes the stored
+        objects and each one is built on first access
+        With DB_FORMAT=binary, the snapshot is the .db_<Class>.bin file
+        written by binary_format instead, the journal staying JSON; it
+        must hold the class and SCHEMA fields or loading it fails
+        With DB_STORAGE=sqlite, every method goes to a SQLiteStorage in
+        DB_SQLITE_PATH instead, and none of the above applies
+        Every class has its own ReadWriteLock: get, search, count and
+        save_to_file read under it, save, remove and load_from_file
+        write under it, so threads never see a half updated class
+        Each class declares its own FIELDS, stored in __slots__ instead
+        of a per-instance __dict__; SCHEMA lists the fields of the class
+        and of its parents, in order, and drives the serialization
+        to_json caches the serialized object in _json, which is not a
+        field; save and the field setters clear it, an attribute set
+        otherwise is only serialized again once the object is saved
     """
 
+    FIELDS = ('id', 'created_at', 'updated_at')
+    __slots__ = FIELDS + ('_json',)
+    SCHEMA = FIELDS
+    INDEXED_ATTRIBUTES = ()
+
+    def __init_subclass__(cls, **kwargs):
+        """ Build the SCHEMA of a subclass from the FIELDS of its MRO
+        """
+        super().__init_subclass__(**kwargs)
+        schema = []
+        for klass in reversed(cls.__mro__):
+            for field in klass.__dict__.get('FIELDS', ()):
+                if field not in schema:
+                    schema.append(field)
+        cls.SCHEMA = tuple(schema)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
@@ -23,15 +380,17 @@ class Base():
         if DATA.get(s_class) is None:
             DATA[s_class] = {}
 
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self._json = None
+        if 'id' in kwargs:
+            self.id = kwargs['id']
+        else:
+            self.id = str(uuid.uuid4())
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -44,69 +403,403 @@ class Base():
             return False
         return (self.id == other.id)
 
+    def serialized(self) -> dict:
+        """ Return the cached JSON dictionary of every field, building
+            it if needed; the dictionary is shared and must not be
+            modified
+        """
+        result = self._json
+        if result is None:
+            result = {}
+            for key in self.SCHEMA:
+                value = getattr(self, key, None)
+                if type(value) is datetime:
+                    result[key] = value.strftime(TIMESTAMP_FORMAT)
+                else:
+                    result[key] = value
+            self._json = result
+        return result
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
+        result = self.serialized()
+        if for_serialization:
+            return dict(result)
+        return {key: value for key, value in result.items()
+                if key[0] != '_'}
+
+    @classmethod
+    def to_json_list(cls, objs: Iterable[TypeVar('Base')]) -> List[dict]:
+        """ Convert objects to JSON dictionaries, without the private
+            fields, for a response serialized right away
+            The public fields are computed once and the cached
+            dictionaries are only copied when they hold private fields
+            Args:
+                objs: the objects to convert
+            Returns:
+                the list of their JSON dictionaries, in order
+        """
+        result = []
+        public = {}
+        for obj in objs:
+            serialized = obj.serialized()
+            keys = public.get(type(obj))
+            if keys is None:
+                keys = public[type(obj)] = tuple(
+                    key for key in type(obj).SCHEMA if key[0] != '_')
+            if len(keys) == len(serialized):
+                result.append(serialized)
             else:
-                result[key] = value
+                result.append({key: serialized[key] for key in keys})
         return result
 
+    @classmethod
+    def lock(cls) -> ReadWriteLock:
+        """ Return the ReadWriteLock guarding the objects of the class
+        """
+        lock = LOCKS.get(cls.__name__)
+        if lock is None:
+            lock = LOCKS.setdefault(cls.__name__, ReadWriteLock())
+        return lock
+
+    @classmethod
+    def file_lock(cls) -> threading.RLock:
+        """ Return the lock serializing the accesses to the class files
+            It is always taken after, never before, the ReadWriteLock
+        """
+        lock = FILE_LOCKS.get(cls.__name__)
+        if lock is None:
+            lock = FILE_LOCKS.setdefault(cls.__name__, threading.RLock())
+        return lock
+
+    @classmethod
+    def indexes(cls) -> dict:
+        """ Return the secondary indexes of the class by attribute
+        """
+        s_class = cls.__name__
+        if INDEXES.get(s_class) is None:
+            INDEXES[s_class] = {attribute: Index(attribute)
+                                for attribute in cls.INDEXED_ATTRIBUTES}
+        return INDEXES[s_class]
+
+    def index(self):
+        """ Add or refresh the current object in the class indexes
+        """
+        for attribute, index in self.__class__.indexes().items():
+            index.add(self.id, getattr(self, attribute, None))
+
+    def unindex(self):
+        """ Remove the current object from the class indexes
+        """
+        for index in self.__class__.indexes().values():
+            index.discard(self.id)
+
+    @classmethod
+    def snapshot_path(cls) -> str:
+        """ Return the path of the snapshot file of the class
+        """
+        return ".db_{}.{}".format(cls.__name__, 'bin' if BINARY else 'json')
+
+    @classmethod
+    def file_signature(cls) -> tuple:
+        """ Return the (mtime, size, inode) of the snapshot and journal
+            files of the class, None for a missing one, so a caller can
+            tell if they changed since it last loaded them
+            Return None with DB_STORAGE=sqlite, where there are no files
+        """
+        if storage() is not None:
+            return None
+        signature = ()
+        for file_path in (cls.snapshot_path(),
+                          ".db_{}.journal".format(cls.__name__)):
+            try:
+                st = stat(file_path)
+            except FileNotFoundError:
+                signature += (None,)
+                continue
+            signature += ((st.st_mtime_ns, st.st_size, st.st_ino),)
+        return signature
+
     @classmethod
     def load_from_file(cls):
         """ Load all objects from file
+            The journal, if any, is replayed over the snapshot; a record
+            torn by a crash ends the replay and the loaded objects are
+            compacted into a new snapshot so later appends stay readable
+            Deferred changes are flushed first so none of them is lost
+            Indexed attributes are read from the stored JSON so lazily
+            loaded objects can be indexed without being built
+            The load time and object count are kept in LOAD_STATS, the
+            apps report them at startup with describe_load
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        if storage() is not None:
+            storage().ensure_table(cls)
             return
+        started = time.perf_counter()
+        s_class = cls.__name__
+        file_path = cls.snapshot_path()
+        journal_path = ".db_{}.journal".format(s_class)
+        objs_json = {}
+        torn = False
+
+        with cls.lock().write():
+            cls.flush_changes()
+            with cls.file_lock():
+                JOURNAL_SIZES[s_class] = 0
+                if path.exists(file_path) and BINARY:
+                    with open(file_path, 'rb') as f:
+                        objs_json = binary_format.load(f, s_class,
+                                                       cls.SCHEMA)
+                elif path.exists(file_path):
+                    with open(file_path, 'r') as f:
+                        objs_json = json.load(f)
+
+                if path.exists(journal_path):
+                    with open(journal_path, 'r') as f:
+                        for line in f:
+                            try:
+                                record = json.loads(line)
+                            except ValueError:
+                                torn = True
+                                break
+                            if record.get('op') == 'save':
+                                obj_json = record['obj']
+                                objs_json[obj_json['id']] = obj_json
+                            else:
+                                objs_json.pop(record.get('id'), None)
+                            JOURNAL_SIZES[s_class] += 1
+
+            INDEXES[s_class] = None
+            SORTED_IDS.pop(s_class, None)
+            for attribute, index in cls.indexes().items():
+                for obj_id, obj_json in objs_json.items():
+                    index.add(obj_id, obj_json.get(attribute))
+            if LAZY_LOAD:
+                DATA[s_class] = LazyObjects(cls, objs_json)
+            else:
+                DATA[s_class] = {obj_id: cls(**obj_json)
+                                 for obj_id, obj_json in objs_json.items()}
+            if torn:
+                cls.save_to_file()
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        LOAD_STATS[s_class] = {'objects': len(objs_json),
+                               'seconds': time.perf_counter() - started,
+                               'lazy': LAZY_LOAD}
+        logger.info(describe_load(s_class))
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
+            The snapshot is written to a temporary file then moved into
+            place, after which the journal it now contains is deleted
         """
+        if storage() is not None:
+            return
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        file_path = cls.snapshot_path()
+        journal_path = ".db_{}.journal".format(s_class)
+        with cls.lock().read(), cls.file_lock():
+            if isinstance(DATA[s_class], LazyObjects):
+                objs_json = DATA[s_class].to_json()
+            else:
+                objs_json = {}
+                for obj_id, obj in DATA[s_class].items():
+                    objs_json[obj_id] = obj.serialized()
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+            if BINARY:
+                with open(file_path + '.tmp', 'wb') as f:
+                    binary_format.dump(objs_json, f, s_class, cls.SCHEMA)
+            else:
+                with open(file_path + '.tmp', 'w') as f:
+                    json.dump(objs_json, f)
+            replace(file_path + '.tmp', file_path)
+            if path.exists(journal_path):
+                remove(journal_path)
+            JOURNAL_SIZES[s_class] = 0
+
+    @classmethod
+    def write_change(cls, record: dict):
+        """ Persist one save or remove
+            Queued for the write-behind thread when DB_WRITE_BEHIND_MS
+            is set, written right away otherwise
+        """
+        global _flusher, _pending_count
+        if WRITE_BEHIND_MS <= 0:
+            cls.write_changes([record])
+            return
+        s_class = cls.__name__
+        with _pending_changed:
+            pending = PENDING.setdefault(s_class, [cls, [], 0])
+            if JOURNAL:
+                pending[1].append(record)
+            pending[2] += 1
+            _pending_count += 1
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_loop, daemon=True)
+                _flusher.start()
+                atexit.register(flush)
+            if _pending_count >= WRITE_BEHIND_CHANGES:
+                _pending_changed.notify()
+
+    @classmethod
+    def write_changes(cls, records: List[dict]):
+        """ Persist a group of saves and removes
+            Appends the records to the journal in one write when
+            DB_JOURNAL is set, rewrites the whole snapshot otherwise
+        """
+        if not JOURNAL:
+            cls.save_to_file()
+            return
+        cls.append_to_journal(records)
+        if JOURNAL_SIZES[cls.__name__] >= JOURNAL_COMPACT:
+            cls.save_to_file()
+
+    @classmethod
+    def append_to_journal(cls, records: List[dict]):
+        """ Append records to the journal in one write
+            A failed write is cut off so no torn record is left behind
+        """
+        s_class = cls.__name__
+        journal_path = ".db_{}.journal".format(s_class)
+        with cls.file_lock():
+            with open(journal_path, 'a') as f:
+                size = f.tell()
+                try:
+                    f.write("".join(json.dumps(record) + '\n'
+                                    for record in records))
+                    f.flush()
+                except BaseException:
+                    f.truncate(size)
+                    raise
+            JOURNAL_SIZES[s_class] = JOURNAL_SIZES.get(s_class, 0) + \
+                len(records)
+
+    @classmethod
+    def flush_changes(cls):
+        """ Persist the changes of the class deferred by write-behind
+            The queue is emptied and written in one step, under the
+            ReadWriteLock for a snapshot and under the file lock for
+            journal records, so a concurrent flush or load_from_file
+            never sees the changes neither queued nor written
+            Changes that fail to be written are queued again, ahead of
+            the ones queued meanwhile, and the error is raised
+        """
+        if not JOURNAL:
+            with cls.lock().read():
+                pending = cls.pop_pending()
+                if pending is not None:
+                    try:
+                        cls.save_to_file()
+                    except BaseException:
+                        cls.requeue(pending)
+                        raise
+            return
+        with cls.file_lock():
+            pending = cls.pop_pending()
+            if pending is not None:
+                try:
+                    cls.append_to_journal(pending[1])
+                except BaseException:
+                    cls.requeue(pending)
+                    raise
+        if pending is not None and \
+                JOURNAL_SIZES[cls.__name__] >= JOURNAL_COMPACT:
+            cls.save_to_file()
+
+    @classmethod
+    def pop_pending(cls) -> list:
+        """ Take the deferred changes of the class out of the queue
+            Returns the [class, journal records, count of changes] entry
+            of PENDING, None if nothing was queued
+        """
+        global _pending_count
+        with _pending_changed:
+            pending = PENDING.pop(cls.__name__, None)
+            if pending is None:
+                return None
+            _pending_count -= pending[2]
+            return pending
+
+    @classmethod
+    def requeue(cls, pending: list):
+        """ Put back an entry taken by pop_pending, ahead of the changes
+            queued since
+        """
+        global _pending_count
+        with _pending_changed:
+            queued = PENDING.get(cls.__name__)
+            if queued is not None:
+                pending[1].extend(queued[1])
+                pending[2] += queued[2]
+                _pending_count -= queued[2]
+            PENDING[cls.__name__] = pending
+            _pending_count += pending[2]
+
+    @classmethod
+    def sync(cls):
+        """ Make every deferred change durable before returning
+            The changes are flushed, then the snapshot and journal files
+            of every class and their directory are fsynced; outside of
+            sync, written changes may still sit in the OS cache
+        """
+        flush()
+        if storage() is not None:
+            return
+        for s_class in list(DATA):
+            with FILE_LOCKS.setdefault(s_class, threading.RLock()):
+                fsync_path(".db_{}.{}".format(
+                    s_class, 'bin' if BINARY else 'json'))
+                fsync_path(".db_{}.journal".format(s_class))
+        fsync_path('.')
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self._json = None
+        if storage() is not None:
+            storage().save(self)
+            return
+        with self.__class__.lock().write():
+            if self.id not in DATA[s_class]:
+                ids = SORTED_IDS.get(s_class)
+                if ids is not None and ids[0] is DATA[s_class]:
+                    insort(ids[1], self.id)
+            DATA[s_class][self.id] = self
+            self.index()
+            self.__class__.write_change({'op': 'save',
+                                         'obj': self.serialized()})
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        if storage() is not None:
+            storage().remove(self)
+            return
+        with self.__class__.lock().write():
+            if DATA[s_class].get(self.id) is not None:
+                ids = SORTED_IDS.get(s_class)
+                if ids is not None and ids[0] is DATA[s_class]:
+                    position = bisect_left(ids[1], self.id)
+                    if ids[1][position:position + 1] == [self.id]:
+                        del ids[1][position]
+                del DATA[s_class][self.id]
+                self.unindex()
+                self.__class__.write_change({'op': 'remove',
+                                             'id': self.id})
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
+        if storage() is not None:
+            return storage().count(cls)
         s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        with cls.lock().read():
+            return len(DATA[s_class].keys())
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -114,18 +807,69 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def page(cls, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects ordered by ID, starting after the
+            ID after; all the following objects when limit is None
+        """
+        if storage() is not None:
+            return storage().page(cls, after, limit)
+        s_class = cls.__name__
+        with cls.lock().read():
+            ids = cls.sorted_ids()
+            start = 0 if after is None else bisect_right(ids, after)
+            end = None if limit is None else start + limit
+            return [DATA[s_class][obj_id] for obj_id in ids[start:end]]
+
+    @classmethod
+    def page_end(cls, after: str = None, limit: int = 1) -> str:
+        """ Return the ID of the last object page(after, limit) returns,
+            None if it returns fewer than limit objects
+        """
+        if storage() is not None:
+            return storage().page_end(cls, after, limit)
+        with cls.lock().read():
+            ids = cls.sorted_ids()
+            end = (0 if after is None else bisect_right(ids, after)) + limit
+            return ids[end - 1] if end <= len(ids) else None
+
+    @classmethod
+    def sorted_ids(cls) -> List[str]:
+        """ Return the sorted IDs of the objects, to be called under the
+            ReadWriteLock
+            The list is kept in SORTED_IDS with the DATA dictionary it
+            was sorted from: save and remove keep it up to date, and it
+            is dropped by load_from_file, which replaces DATA, and sorted
+            again on the next call
+        """
+        s_class = cls.__name__
+        objs = DATA[s_class]
+        ids = SORTED_IDS.get(s_class)
+        if ids is None or ids[0] is not objs:
+            ids = SORTED_IDS[s_class] = (objs, sorted(objs))
+        return ids[1]
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
+        if storage() is not None:
+            return storage().get(cls, id)
         s_class = cls.__name__
-        return DATA[s_class].get(id)
+        with cls.lock().read():
+            return DATA[s_class].get(id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+            Candidates come from the index of the first indexed attribute
+            searched, if any, instead of every object of the class
         """
+        if storage() is not None:
+            return storage().search(cls, attributes)
         s_class = cls.__name__
+
         def _search(obj):
             if len(attributes) == 0:
                 return True
@@ -133,5 +877,16 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        with cls.lock().read():
+            objs = DATA[s_class].values()
+            indexes = cls.indexes()
+            for k, v in attributes.items():
+                if k in indexes:
+                    try:
+                        ids = indexes[k].lookup(v)
+                    except TypeError:
+                        continue
+                    objs = [DATA[s_class][obj_id] for obj_id in ids]
+                    break
+            return list(filter(_search, objs))
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+""" Binary snapshot module
+    A snapshot starts with a header naming the format version, the class
+    and its fields, followed by blocks of up to BLOCK_SIZE objects
+    Each block stores its objects field by field, so a whole column is
+    encoded or decoded at once instead of value by value
+    All integers are little-endian
+        header: MAGIC, version (H), number of objects (Q),
+                class name (H + utf-8), number of fields (H),
+                each field name (H + utf-8)
+        block:  number of objects (I), then for each field:
+                kind (1 byte), number of None (I), their positions (i),
+                lengths of the other values (i, STRINGS only),
+                data size (Q), utf-8 data
+    The other values of a column are joined by SEPARATOR, so they are
+    decoded with one split: as is for SPLIT columns, JSON encoded for
+    JSON columns, whose values are not all strings; STRINGS columns,
+    whose values contain SEPARATOR, store their lengths in characters
+    instead
+"""
+from array import array
+from itertools import accumulate, repeat
+import json
+import struct
+import sys
+from typing import BinaryIO, Iterable, List, Tuple
+
+
+MAGIC = b'BDB\x00'
+VERSION = 1
+BLOCK_SIZE = 65536
+SPLIT = b's'
+STRINGS = b'l'
+JSON = b'j'
+SEPARATOR = '\x00'
+ENCODING = 'utf-8'
+ERRORS = 'surrogatepass'
+HEADER = struct.Struct('<4sHQ')
+SHORT = struct.Struct('<H')
+COUNT = struct.Struct('<I')
+SIZE = struct.Struct('<Q')
+
+
+def _write_text(f: BinaryIO, text: str):
+    """ Write a length-prefixed utf-8 string
+    """
+    data = text.encode(ENCODING, ERRORS)
+    f.write(SHORT.pack(len(data)))
+    f.write(data)
+
+
+def _read(f: BinaryIO, size: int) -> bytes:
+    """ Read exactly size bytes, raise ValueError if the file is shorter
+    """
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("truncated binary snapshot")
+    return data
+
+
+def _read_text(f: BinaryIO) -> str:
+    """ Read a length-prefixed utf-8 string
+    """
+    size, = SHORT.unpack(_read(f, SHORT.size))
+    return _read(f, size).decode(ENCODING, ERRORS)
+
+
+def _ints_to_bytes(ints: List[int]) -> bytes:
+    """ Return the little-endian bytes of a list of integers
+    """
+    ints = array('i', ints)
+    if sys.byteorder == 'big':
+        ints.byteswap()
+    return ints.tobytes()
+
+
+def _ints_from_bytes(data: bytes) -> array:
+    """ Return the array of integers of little-endian bytes
+    """
+    ints = array('i')
+    ints.frombytes(data)
+    if sys.byteorder == 'big':
+        ints.byteswap()
+    return ints
+
+
+def _write_column(f: BinaryIO, values: List):
+    """ Write the values of one field of a block
+    """
+    nulls = []
+    if None in values:
+        nulls = [i for i, value in enumerate(values) if value is None]
+        values = [value for value in values if value is not None]
+    try:
+        data = SEPARATOR.join(values)
+    except TypeError:
+        kind = JSON
+        data = SEPARATOR.join(map(json.dumps, values))
+    else:
+        kind = SPLIT
+        if data.count(SEPARATOR) != max(len(values) - 1, 0):
+            kind = STRINGS
+            data = ''.join(values)
+    f.write(kind)
+    f.write(COUNT.pack(len(nulls)))
+    f.write(_ints_to_bytes(nulls))
+    if kind == STRINGS:
+        f.write(_ints_to_bytes([len(value) for value in values]))
+    data = data.encode(ENCODING, ERRORS)
+    f.write(SIZE.pack(len(data)))
+    f.write(data)
+
+
+def _read_column(f: BinaryIO, count: int) -> List:
+    """ Read the values of one field of a block of count objects
+    """
+    kind = _read(f, 1)
+    if kind not in (SPLIT, STRINGS, JSON):
+        raise ValueError("unknown column kind {!r}".format(kind))
+    null_count, = COUNT.unpack(_read(f, COUNT.size))
+    nulls = _ints_from_bytes(_read(f, 4 * null_count))
+    present = count - null_count
+    if kind == STRINGS:
+        lengths = _ints_from_bytes(_read(f, 4 * present))
+    size, = SIZE.unpack(_read(f, SIZE.size))
+    text = _read(f, size).decode(ENCODING, ERRORS)
+
+    if kind == STRINGS:
+        values = []
+        start = 0
+        for end in accumulate(lengths):
+            values.append(text[start:end])
+            start = end
+        if start != len(text):
+            raise ValueError("corrupted binary snapshot column")
+    elif present:
+        values = text.split(SEPARATOR)
+    else:
+        values = []
+    if len(values) != present:
+        raise ValueError("corrupted binary snapshot column")
+    if kind == JSON:
+        values = [json.loads(value) for value in values]
+
+    if nulls:
+        filled = [None] * count
+        positions = sorted(set(range(count)).difference(nulls))
+        for position, value in zip(positions, values):
+            filled[position] = value
+        values = filled
+    return values
+
+
+def dump(objs_json: dict, f: BinaryIO, class_name: str,
+         fields: Iterable[str] = None):
+    """ Write serialized objects as a binary snapshot
+        Args:
+            objs_json: the JSON dictionaries of the objects by id
+            f: a file opened for writing in binary mode
+            class_name: the name of the class of the objects
+            fields: the fields to store, defaults to the keys of the
+                    objects in order of appearance; missing ones are None
+    """
+    if fields is None:
+        fields = {}
+        for obj_json in objs_json.values():
+            fields.update(dict.fromkeys(obj_json))
+    fields = list(fields)
+    f.write(HEADER.pack(MAGIC, VERSION, len(objs_json)))
+    _write_text(f, class_name)
+    f.write(SHORT.pack(len(fields)))
+    for field in fields:
+        _write_text(f, field)
+    objs = list(objs_json.values())
+    for start in range(0, len(objs), BLOCK_SIZE):
+        block = objs[start:start + BLOCK_SIZE]
+        f.write(COUNT.pack(len(block)))
+        for field in fields:
+            _write_column(f, [obj_json.get(field) for obj_json in block])
+
+
+def read_header(f: BinaryIO) -> Tuple[int, str, List[str]]:
+    """ Read the header of a binary snapshot
+        Args:
+            f: a file opened for reading in binary mode
+        Returns:
+            the number of objects, the class name and the fields
+    """
+    magic, version, total = HEADER.unpack(_read(f, HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("not a binary snapshot")
+    if version != VERSION:
+        raise ValueError("unsupported binary snapshot version {}"
+                         .format(version))
+    class_name = _read_text(f)
+    count, = SHORT.unpack(_read(f, SHORT.size))
+    fields = [_read_text(f) for _ in range(count)]
+    return total, class_name, fields
+
+
+def load(f: BinaryIO, class_name: str = None,
+         fields: Iterable[str] = None) -> dict:
+    """ Read a binary snapshot
+        Args:
+            f: a file opened for reading in binary mode
+            class_name: the class the objects must be of, any if None
+            fields: the fields the snapshot must store, in any order,
+                    any if None
+        Returns:
+            the JSON dictionaries of the objects by id, as json.load
+            returns them from a JSON snapshot
+        Raises ValueError if the header does not match class_name or
+        fields
+    """
+    total, stored_class, stored_fields = read_header(f)
+    if class_name is not None and stored_class != class_name:
+        raise ValueError("binary snapshot of {} objects, not {}"
+                         .format(stored_class, class_name))
+    if fields is not None and set(stored_fields) != set(fields):
+        raise ValueError("binary snapshot fields {} do not match {}"
+                         .format(stored_fields, list(fields)))
+    fields = stored_fields
+    objs_json = {}
+    loaded = 0
+    while loaded < total:
+        count, = COUNT.unpack(_read(f, COUNT.size))
+        loaded += count
+        columns = [_read_column(f, count) for _ in fields]
+        objs = list(map(dict, map(zip, repeat(fields), zip(*columns))))
+        objs_json.update(zip((obj_json['id'] for obj_json in objs), objs))
+    return objs_json
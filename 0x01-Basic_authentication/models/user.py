@@ -9,6 +9,10 @@ class User(Base):
     """ User class
     """
 
+    FIELDS = ('email', '_password', 'first_name', 'last_name')
+    __slots__ = FIELDS
+    INDEXED_ATTRIBUTES = ('email',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
         """
@@ -28,6 +32,7 @@ class User(Base):
     def password(self, pwd: str):
         """ Setter of a new password: encrypt in SHA256
         """
+        self._json = None
         if pwd is None or type(pwd) is not str:
             self._password = None
         else:
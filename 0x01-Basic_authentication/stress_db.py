@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+""" Concurrency stress test of the model persistence
+    Writer threads save, search and remove users, reader threads get,
+    search, count and list them and loader threads reload them from
+    file, all at once for a number of seconds, in a temporary directory
+    The run fails if any thread raised, if the stored users are not the
+    ones saved and not removed, or if the users in memory, on disk and
+    in the email index disagree once everything is flushed; with
+    DB_STORAGE=sqlite the stored users are the database ones
+    The DB_* settings apply as usual, so every persistence mode can be
+    stressed
+    eg.
+        DB_JOURNAL=1 DB_WRITE_BEHIND_MS=5 ./stress_db.py --seconds 10
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List
+
+from models.user import User
+
+
+def run_for(seconds: float, errors: List[str],
+            func: Callable[[int], None]) -> Callable[[int], None]:
+    """ Returns a thread target calling func(n) until seconds elapsed,
+        the first exception raised being appended to errors
+    """
+    def target(n: int):
+        """ Calls func until the deadline
+        """
+        deadline = time.monotonic() + seconds
+        try:
+            while time.monotonic() < deadline:
+                func(n)
+        except Exception as e:
+            errors.append("{}: {!r}".format(func.__name__, e))
+    return target
+
+
+def stress(seconds: float, writers: int, readers: int,
+           loaders: int) -> List[str]:
+    """ Hammers User from many threads and checks the stored users
+        Returns:
+            the list of errors, empty if the run passed
+    """
+    errors = []
+    emails = []
+    saved = []
+    removed = []
+
+    def write(n: int):
+        """ Saves a user, and sometimes removes one of the same writer
+        """
+        user = User(email="{}-{}@example.com".format(n, random.random()),
+                    first_name=str(n))
+        user.save()
+        saved.append(user.id)
+        emails.append(user.email)
+        if random.random() < 0.3:
+            users = User.search({'first_name': str(n)})
+            if users:
+                users[0].remove()
+                removed.append(users[0].id)
+
+    def read(n: int):
+        """ Looks users up by email and id, counts and lists them
+        """
+        if emails:
+            for user in User.search({'email': random.choice(emails)}):
+                User.get(user.id)
+        User.count()
+        User.all()
+
+    def load(n: int):
+        """ Reloads the users from file
+        """
+        User.load_from_file()
+        time.sleep(0.01)
+
+    User.load_from_file()
+    threads = [threading.Thread(target=run_for(seconds, errors, func),
+                                args=(n,))
+               for func, count in ((write, writers), (read, readers),
+                                   (load, loaders))
+               for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    User.sync()
+
+    memory = {user.id: user.to_json(True) for user in User.all()}
+    expected = set(saved).difference(removed)
+    if set(memory) != expected:
+        errors.append("{} users stored, {} saved and not removed".format(
+            len(memory), len(expected)))
+    User.load_from_file()
+    disk = {user.id: user.to_json(True) for user in User.all()}
+    differ = [obj_id for obj_id in set(memory) | set(disk)
+              if memory.get(obj_id) != disk.get(obj_id)]
+    if differ:
+        errors.append("{} users differ between memory and disk".format(
+            len(differ)))
+    for obj_id, user_json in disk.items():
+        found = User.search({'email': user_json['email']})
+        if [user.id for user in found] != [obj_id]:
+            errors.append("email index is wrong for {}".format(obj_id))
+            break
+    return errors
+
+
+def main() -> None:
+    """ Command line entry point
+    """
+    parser = argparse.ArgumentParser(
+        description="Stress the model persistence from many threads")
+    parser.add_argument('--seconds', type=float, default=4,
+                        help="duration of the run")
+    parser.add_argument('--writers', type=int, default=8,
+                        help="number of writer threads")
+    parser.add_argument('--readers', type=int, default=8,
+                        help="number of reader threads")
+    parser.add_argument('--loaders', type=int, default=2,
+                        help="number of loader threads")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            errors = stress(args.seconds, args.writers, args.readers,
+                            args.loaders)
+            count = User.count()
+        finally:
+            os.chdir(cwd)
+    for error in errors:
+        print(error, file=sys.stderr)
+    print("{}: {} users".format("FAILED" if errors else "OK", count))
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
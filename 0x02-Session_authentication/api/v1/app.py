@@ -6,7 +6,9 @@ from os import getenv
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
+from models.base import LOAD_STATS, describe_load
 import os
+import sys
 
 
 app = Flask(__name__)
@@ -14,6 +16,14 @@ app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 auth = None
 auth_type = getenv('AUTH_TYPE')
+for s_class in LOAD_STATS:
+    print(describe_load(s_class), file=sys.stderr)
+AUTH_PATHS = (
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+    '/api/v1/auth_session/login/',
+)
 
 
 if auth_type:
@@ -22,7 +32,9 @@ if auth_type:
     from api.v1.auth.session_auth import SessionAuth
     from api.v1.auth.session_exp_auth import SessionExpAuth
     from api.v1.auth.session_db_auth import SessionDBAuth
+    from api.v1.auth.session_token_auth import SessionTokenAuth
     authentification = {
+            'session_token_auth': SessionTokenAuth,
             'session_db_auth': SessionDBAuth,
             'session_exp_auth': SessionExpAuth,
             'session_auth': SessionAuth,
@@ -30,6 +42,7 @@ if auth_type:
             'auth': Auth}
     if auth_type in authentification:
         auth = authentification[auth_type]()
+        auth.path_matcher(AUTH_PATHS)
 
 
 @app.before_request
@@ -39,13 +52,7 @@ def before_request():
     """
     if not auth:
         return
-    auth_paths = [
-            '/api/v1/status/',
-            '/api/v1/unauthorized/',
-            '/api/v1/forbidden/',
-            '/api/v1/auth_session/login/'
-            ]
-    if not auth.require_auth(request.path, auth_paths):
+    if not auth.require_auth(request.path, AUTH_PATHS):
         return
     if not auth.authorization_header(request) \
             and not auth.session_cookie(request):
@@ -1,17 +1,77 @@
 #!/usr/bin/env python3
 """ Authentication module """
+from functools import lru_cache
 from typing import List, TypeVar
 from os import getenv
 
 
+class PathMatcher:
+    """ PathMatcher class
+        Tells if a path is excluded from auth, built once from the
+        excluded paths: exact paths go in a set and paths ending with *
+        in a trie of their prefixes, so a lookup costs the length of the
+        path whatever the number of excluded paths
+        The MEMO_SIZE most recent decisions are memoized
+        Methods:
+            - is_excluded
+    """
+    MEMO_SIZE = 1024
+
+    def __init__(self, excluded_paths: List[str]):
+        """ Constructor
+            Args:
+                excluded_paths: list of strings. Paths to exclude from auth
+                    May end with * to match prefix
+        """
+        self.exact = set()
+        self.prefixes = {}
+        for p in excluded_paths:
+            if not p:
+                continue
+            if p[-1] != '*':
+                self.exact.add(p)
+                continue
+            node = self.prefixes
+            for char in p[:-1]:
+                node = node.setdefault(char, {})
+            node[None] = True
+        self.is_excluded = lru_cache(maxsize=self.MEMO_SIZE)(
+            self.is_excluded)
+
+    def is_excluded(self, path: str) -> bool:
+        """ is excluded method
+            Args:
+                path: string. Non empty path to check, a trailing / is
+                    added if missing
+            Returns:
+                True if the path is excluded from auth
+        """
+        if path[-1] != '/':
+            path += '/'
+        if path in self.exact:
+            return True
+        node = self.prefixes
+        for char in path:
+            if None in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return None in node
+
+
 class Auth:
     """ Auth class
         Defines methods to authenticate a request
         Methods:
             - require_auth
+            - path_matcher
             - authorization_header
             - current_user
+        The PathMatcher of each tuple of excluded paths is built once and
+        kept for MATCHERS_SIZE different tuples
     """
+    MATCHERS_SIZE = 16
 
     def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
         """ require auth method
@@ -22,15 +82,23 @@ class Auth:
         """
         if not path or not excluded_paths:
             return True
-        if path[-1] != '/':
-            path += '/'
-        for p in excluded_paths:
-            if p[-1] == '*':
-                if path.startswith(p[:-1]):
-                    return False
-            elif path == p:
-                return False
-        return True
+        return not self.path_matcher(excluded_paths).is_excluded(path)
+
+    def path_matcher(self, excluded_paths: List[str]) -> PathMatcher:
+        """ path matcher method
+            Returns the PathMatcher of excluded_paths, looked up by their
+            content frozen in a tuple, so a list changed in place or
+            passed anew gets the matcher of its current paths
+        """
+        return self.matcher_for(tuple(excluded_paths))
+
+    @staticmethod
+    @lru_cache(maxsize=MATCHERS_SIZE)
+    def matcher_for(excluded_paths: tuple) -> PathMatcher:
+        """ Returns the PathMatcher of a tuple of excluded paths, built
+            on its first lookup
+        """
+        return PathMatcher(excluded_paths)
 
     def authorization_header(self, request=None) -> str:
         """ authorization header method
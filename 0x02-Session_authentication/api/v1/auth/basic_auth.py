@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 """ Authentication module """
 from base64 import b64decode
+from collections import OrderedDict
+from hashlib import sha256
+from os import getenv
+import threading
+import time
 from api.v1.auth.auth import Auth
 from models.user import User
 from typing import TypeVar
@@ -14,8 +19,32 @@ class BasicAuth(Auth):
             - decode_base64_authorization_header
             - extract_user_credentials
             - user_object_from_credentials
+            - cached_user
+            - cache_user
             - current_user
+        Verified Authorization headers are kept in a bounded LRU cache,
+        by SHA-256 digest, with the id, email, password hash and update
+        time of their user; a hit only holds while the user still has
+        them, so updating, deleting or changing the password of the user
+        invalidates it
     """
+    def __init__(self):
+        """ Constructor
+            Set the size and time to live in seconds of the cache in the
+            environment variables BASIC_AUTH_CACHE_SIZE and
+            BASIC_AUTH_CACHE_TTL, a size of 0 disables it
+        """
+        try:
+            self.cache_size = int(getenv('BASIC_AUTH_CACHE_SIZE', 1024))
+        except ValueError:
+            self.cache_size = 1024
+        try:
+            self.cache_ttl = float(getenv('BASIC_AUTH_CACHE_TTL', 60))
+        except ValueError:
+            self.cache_ttl = 60.0
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+
     def extract_base64_authorization_header(self,
                                             authorization_header: str) -> str:
         """ Extract base64 authorization header
@@ -92,6 +121,52 @@ class BasicAuth(Auth):
             return None
         return user
 
+    def cached_user(self, key: bytes) -> TypeVar('User'):
+        """ User object of a cached Authorization header
+            Args:
+                key: bytes. Digest of the Authorization header
+            Returns:
+                User instance, or None if the header is not cached or
+                its entry expired or no longer matches the user
+        """
+        with self.cache_lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            if entry[-1] < time.monotonic():
+                del self.cache[key]
+                return None
+            self.cache.move_to_end(key)
+        user_id, email, password, updated_at, _ = entry
+        try:
+            user = User.get(user_id)
+        except Exception:
+            user = None
+        if user is None or user.email != email \
+                or user.password != password \
+                or user.updated_at != updated_at:
+            with self.cache_lock:
+                if self.cache.get(key) is entry:
+                    del self.cache[key]
+            return None
+        return user
+
+    def cache_user(self, key: bytes, user: TypeVar('User')):
+        """ Cache the user of a verified Authorization header
+            Args:
+                key: bytes. Digest of the Authorization header
+                user: User instance. Its verified user
+        """
+        if self.cache_size <= 0:
+            return
+        entry = (user.id, user.email, user.password, user.updated_at,
+                 time.monotonic() + self.cache_ttl)
+        with self.cache_lock:
+            self.cache[key] = entry
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
     def current_user(self, request=None) -> TypeVar('User'):
         """ Overloads auth.current_user and retrieves user instance
             Args:
@@ -102,6 +177,10 @@ class BasicAuth(Auth):
         auth_header = self.authorization_header(request)
         if not auth_header:
             return None
+        key = sha256(auth_header.encode('utf-8', 'surrogatepass')).digest()
+        user = self.cached_user(key)
+        if user is not None:
+            return user
         base64_auth_header = self.extract_base64_authorization_header(
             auth_header)
         if not base64_auth_header:
@@ -114,4 +193,7 @@ class BasicAuth(Auth):
             decoded_base64_auth_header)
         if not all(user_credentials):
             return None
-        return self.user_object_from_credentials(*user_credentials)
+        user = self.user_object_from_credentials(*user_credentials)
+        if user is not None:
+            self.cache_user(key, user)
+        return user
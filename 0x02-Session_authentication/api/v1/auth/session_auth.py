@@ -45,5 +45,5 @@ class SessionAuth(Auth):
             return False
         if not self.user_id_for_session_id(session_id):
             return False
-        del self.user_id_by_session_id[session_id]
+        self.user_id_by_session_id.pop(session_id, None)
         return True
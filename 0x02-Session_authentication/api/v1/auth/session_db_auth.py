@@ -1,13 +1,70 @@
 #!/usr/bin/env python3
 """ Session Authentication module """
 from datetime import datetime, timedelta
+import threading
 from api.v1.auth.session_exp_auth import SessionExpAuth
 from models.user_session import UserSession
 
 
 class SessionDBAuth(SessionExpAuth):
     """ Session DB Auth class
+        UserSession objects are kept in sessions_by_id by session ID,
+        written through by create_session and destroy_session, and only
+        loaded again from file when UserSession.file_signature shows the
+        files changed, so a lookup costs no file read
+        With DB_STORAGE=sqlite there are no files, sessions are searched
+        in the database instead
     """
+    sessions_by_id = {}
+    sessions_signature = None
+    sessions_lock = threading.Lock()
+
+    def refresh_sessions(self, signature: tuple):
+        """ Loads the UserSession objects again if their files changed
+            since sessions_by_id was built
+            Args:
+                signature: tuple. Current UserSession.file_signature()
+        """
+        if signature == SessionDBAuth.sessions_signature:
+            return
+        with self.sessions_lock:
+            if signature == SessionDBAuth.sessions_signature:
+                return
+            UserSession.load_from_file()
+            SessionDBAuth.sessions_by_id = {
+                user_session.session_id: user_session
+                for user_session in UserSession.all()}
+            SessionDBAuth.sessions_signature = signature
+
+    def session_for_id(self, session_id: str) -> UserSession:
+        """ Returns the UserSession of a Session ID, None if there is none
+        """
+        signature = UserSession.file_signature()
+        if signature is None:
+            user_session = UserSession.search({'session_id': session_id})
+            return user_session[0] if user_session else None
+        self.refresh_sessions(signature)
+        return self.sessions_by_id.get(session_id)
+
+    def write_through(self, session_id: str, user_session: UserSession,
+                      write):
+        """ Calls write to save or remove user_session and updates
+            sessions_by_id with it, None meaning removed
+            The new file signature is recorded if sessions_by_id was up
+            to date before, so the own writes do not force a reload
+        """
+        with self.sessions_lock:
+            signature = UserSession.file_signature()
+            write()
+            if user_session is None:
+                self.sessions_by_id.pop(session_id, None)
+            else:
+                self.sessions_by_id[session_id] = user_session
+            if signature is not None \
+                    and signature == SessionDBAuth.sessions_signature:
+                SessionDBAuth.sessions_signature = \
+                    UserSession.file_signature()
+
     def create_session(self, user_id: str = None) -> str:
         """ Creates and stores new instance of UserSession
         """
@@ -15,7 +72,7 @@ class SessionDBAuth(SessionExpAuth):
         if not session_id:
             return None
         user_session = UserSession(user_id=user_id, session_id=session_id)
-        user_session.save()
+        self.write_through(session_id, user_session, user_session.save)
         return session_id
 
     def user_id_for_session_id(self, session_id=None) -> str:
@@ -23,11 +80,9 @@ class SessionDBAuth(SessionExpAuth):
         """
         if session_id is None:
             return None
-        UserSession.load_from_file()
-        user_session = UserSession.search({'session_id': session_id})
+        user_session = self.session_for_id(session_id)
         if not user_session:
             return None
-        user_session = user_session[0]
 
         if user_session.created_at + \
                 timedelta(seconds=self.session_duration) < datetime.utcnow():
@@ -44,9 +99,8 @@ class SessionDBAuth(SessionExpAuth):
         session_id = self.session_cookie(request)
         if not session_id:
             return False
-        user_session = UserSession.search({'session_id': session_id})
+        user_session = self.session_for_id(session_id)
         if not user_session:
             return False
-        user_session = user_session[0]
-        user_session.remove()
+        self.write_through(session_id, None, user_session.remove)
         return True
@@ -2,11 +2,24 @@
 """ Session Authentication module """
 from os import getenv
 from datetime import datetime, timedelta
+import heapq
+import threading
 from api.v1.auth.session_auth import SessionAuth
 
 
 class SessionExpAuth(SessionAuth):
-    """ Session Exp Auth class """
+    """ Session Exp Auth class
+        Sessions are also pushed on a min-heap by expiry time, which
+        create_session and user_id_for_session_id sweep so expired
+        sessions are evicted from user_id_by_session_id in
+        O(expired log n); heap entries of destroyed or replaced sessions
+        are skipped, only the session dictionary they were pushed with
+        is evicted
+    """
+    expiry_heap = []
+    expiry_lock = threading.Lock()
+    evicted_sessions = 0
+
     def __init__(self):
         """ Constructor
             Set the session duration in the environment variable
@@ -25,12 +38,51 @@ class SessionExpAuth(SessionAuth):
         if not session_id:
             return None
 
-        self.user_id_by_session_id[session_id] = {
+        session_dictionary = {
             'user_id': user_id,
             'created_at': datetime.now()
         }
+        self.user_id_by_session_id[session_id] = session_dictionary
+        if self.session_duration > 0:
+            expires_at = session_dictionary['created_at'] + \
+                timedelta(seconds=self.session_duration)
+            with self.expiry_lock:
+                heapq.heappush(self.expiry_heap,
+                               (expires_at, session_id, session_dictionary))
+        self.sweep_sessions()
         return session_id
 
+    def sweep_sessions(self) -> int:
+        """ Evicts the expired sessions
+            The heap is first peeked at without the lock, another thread
+            may empty it meanwhile; it is checked again under the lock
+            Returns the number of sessions evicted
+        """
+        heap = self.expiry_heap
+        now = datetime.now()
+        try:
+            if heap[0][0] >= now:
+                return 0
+        except IndexError:
+            return 0
+        evicted = 0
+        with self.expiry_lock:
+            while heap and heap[0][0] < now:
+                _, session_id, session_dictionary = heapq.heappop(heap)
+                if self.user_id_by_session_id.get(session_id) \
+                        is session_dictionary:
+                    self.user_id_by_session_id.pop(session_id, None)
+                    evicted += 1
+            SessionExpAuth.evicted_sessions += evicted
+        return evicted
+
+    def session_counts(self) -> dict:
+        """ Returns the gauges of the sessions kept in memory:
+            the live ones and the ones evicted since the start
+        """
+        return {'live': len(self.user_id_by_session_id),
+                'evicted': SessionExpAuth.evicted_sessions}
+
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """ returns a User ID based on a Session ID
             Determines if session time is expired
@@ -38,6 +90,7 @@ class SessionExpAuth(SessionAuth):
         if not session_id:
             return None
 
+        self.sweep_sessions()
         session_dictionary = self.user_id_by_session_id.get(session_id)
         if not session_dictionary:
             return None
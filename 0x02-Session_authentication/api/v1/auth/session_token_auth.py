@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+""" Session Authentication module """
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from hashlib import sha256
+import hmac
+import json
+import logging
+from os import getenv, urandom
+import time
+from api.v1.auth.session_auth import SessionAuth
+
+
+logger = logging.getLogger(__name__)
+
+
+class SessionTokenAuth(SessionAuth):
+    """ Session Token Auth class
+        The Session ID is a stateless token signed with HMAC-SHA256:
+            <key id>.<payload>.<signature>
+        the payload being the base64url JSON of the user ID and the
+        expiry time, so any worker sharing the secret verifies it
+        without a session store
+        Tokens are signed with SESSION_SECRET and also accepted when
+        signed with one of the comma separated SESSION_SECRET_PREVIOUS
+        keys, the key id telling which one to check, so the secret can
+        be rotated without logging every user out
+        Being stateless, a token cannot be revoked before it expires:
+        destroy_session only checks it, rotating the secret out
+        revokes every token signed with it; every token therefore
+        expires, after DEFAULT_DURATION seconds unless SESSION_DURATION
+        sets a positive lifetime
+    """
+    DEFAULT_DURATION = 3600
+    revocable = False
+
+    def __init__(self):
+        """ Constructor
+            Set the session duration and the secrets in the environment
+            variables SESSION_DURATION, SESSION_SECRET and
+            SESSION_SECRET_PREVIOUS; without SESSION_SECRET a random one
+            is used, only valid for this process, and a warning is logged
+        """
+        try:
+            self.session_duration = int(getenv('SESSION_DURATION', 0))
+        except ValueError:
+            self.session_duration = 0
+        if self.session_duration <= 0:
+            self.session_duration = self.DEFAULT_DURATION
+        secret = getenv('SESSION_SECRET')
+        if not secret:
+            logger.warning("SESSION_SECRET is not set: session tokens are "
+                           "signed with a random key, only valid for this "
+                           "process")
+        self.key = secret.encode('utf-8') if secret else urandom(32)
+        self.keys = {self.key_id(self.key): self.key}
+        for previous in getenv('SESSION_SECRET_PREVIOUS', '').split(','):
+            if previous:
+                previous = previous.encode('utf-8')
+                self.keys.setdefault(self.key_id(previous), previous)
+
+    @staticmethod
+    def key_id(key: bytes) -> str:
+        """ Returns the id of a key, which does not reveal it
+        """
+        return sha256(b'key id:' + key).hexdigest()[:8]
+
+    @staticmethod
+    def sign(key: bytes, message: str) -> str:
+        """ Returns the base64url HMAC-SHA256 of message
+        """
+        mac = hmac.new(key, message.encode('ascii'), sha256).digest()
+        return urlsafe_b64encode(mac).decode('ascii').rstrip('=')
+
+    def create_session(self, user_id: str = None) -> str:
+        """ Creates a signed token for a user_id
+        """
+        if user_id is None \
+                or not isinstance(user_id, str):
+            return None
+        claims = {'user_id': user_id,
+                  'exp': int(time.time()) + self.session_duration}
+        payload = urlsafe_b64encode(
+            json.dumps(claims, separators=(',', ':')).encode('utf-8')
+        ).decode('ascii').rstrip('=')
+        message = self.key_id(self.key) + '.' + payload
+        return message + '.' + self.sign(self.key, message)
+
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """ returns the User ID of a token
+            None if it is malformed, signed with an unknown key, has a
+            wrong signature or expired
+            Tokens are ASCII, anything else is rejected before the
+            signature is compared
+        """
+        if not session_id \
+                or not isinstance(session_id, str) \
+                or not session_id.isascii() \
+                or session_id.count('.') != 2:
+            return None
+        kid, payload, signature = session_id.split('.')
+        key = self.keys.get(kid)
+        if key is None:
+            return None
+        expected = self.sign(key, kid + '.' + payload)
+        if not hmac.compare_digest(expected, signature):
+            return None
+        try:
+            claims = json.loads(urlsafe_b64decode(
+                payload + '=' * (-len(payload) % 4)))
+        except ValueError:
+            return None
+        if not isinstance(claims, dict):
+            return None
+        exp = claims.get('exp')
+        if not isinstance(exp, (int, float)) or exp < time.time():
+            return None
+        user_id = claims.get('user_id')
+        return user_id if isinstance(user_id, str) else None
+
+    def destroy_session(self, request=None) -> bool:
+        """ Checks the token of the request cookie
+            A stateless token cannot be revoked, it stays valid until
+            it expires: revocable tells the logout view so, which only
+            clears the cookie
+        """
+        if not request:
+            return False
+        session_id = self.session_cookie(request)
+        if not session_id:
+            return False
+        return self.user_id_for_session_id(session_id) is not None
@@ -19,10 +19,15 @@ def stats() -> str:
     """ GET /api/v1/stats
     Return:
       - the number of each objects
+      - the live and evicted sessions kept in memory, if the
+        authentication expires them
     """
     from models.user import User
+    from api.v1.app import auth
     stats = {}
     stats['users'] = User.count()
+    if hasattr(auth, 'session_counts'):
+        stats['sessions'] = auth.session_counts()
     return jsonify(stats)
 
 
@@ -44,10 +44,17 @@ def login() -> str:
 def logout() -> str:
     """ DELETE /api/v1/auth_session/logout
     Return:
-      -
+      - empty JSON, the session cookie being cleared
+      - {"revoked": false} when the session cannot be revoked and stays
+        valid until it expires
     """
     from api.v1.app import auth
 
     if not auth.destroy_session(request):
         abort(404)
-    return jsonify({}), 200
+    if getattr(auth, 'revocable', True):
+        response = jsonify({})
+    else:
+        response = jsonify({"revoked": False})
+    response.delete_cookie(getenv("SESSION_NAME"))
+    return response, 200
@@ -2,18 +2,78 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import (Response, abort, json, jsonify, request,
+                   stream_with_context)
 from models.user import User
 
 
+STREAM_PAGE_SIZE = 1000
+
+
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: maximum number of users returned
+      - after: only users whose ID is greater than after are returned
+      - stream: 1, true or yes to stream the JSON array as it is built
     Return:
-      - list of all User objects JSON represented
+      - list of all User objects JSON represented, ordered by ID when
+        paginated; the X-Next-After header holds the after value of the
+        next page when there may be one, streamed or not
+      - 400 if limit is not a positive integer
+    """
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    stream = request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+    if limit is None and after is None and not stream:
+        return jsonify(User.to_json_list(User.all()))
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+
+    if stream:
+        response = Response(stream_with_context(_stream_users(after, limit)),
+                            mimetype='application/json')
+        if limit is not None:
+            next_after = User.page_end(after, limit)
+            if next_after is not None:
+                response.headers['X-Next-After'] = next_after
+        return response
+
+    users = User.page(after, limit)
+    response = jsonify(User.to_json_list(users))
+    if limit is not None and len(users) == limit:
+        response.headers['X-Next-After'] = users[-1].id
+    return response
+
+
+def _stream_users(after: str = None, limit: int = None):
+    """ Yield the JSON array of the users after the ID after, fetched
+        by pages of STREAM_PAGE_SIZE users so memory stays bounded
+        Users are serialized by the app JSON settings, as jsonify does
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    yield '['
+    first = True
+    while limit is None or limit > 0:
+        size = STREAM_PAGE_SIZE if limit is None \
+            else min(limit, STREAM_PAGE_SIZE)
+        users = User.page(after, size)
+        for user_json in User.to_json_list(users):
+            yield ('' if first else ',') + json.dumps(
+                user_json, separators=(',', ':'))
+            first = False
+        if len(users) < size:
+            break
+        after = users[-1].id
+        if limit is not None:
+            limit -= len(users)
+    yield ']\n'
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+""" Converts model snapshots between the JSON and binary formats
+    The direction follows the input: a binary snapshot is written as
+    JSON, anything else is read as JSON and written as binary
+    eg.
+        ./convert_db.py .db_User.json .db_User.bin
+        ./convert_db.py .db_UserSession.bin .db_UserSession.json
+"""
+import argparse
+import json
+from os import path, replace
+import re
+import sys
+
+from models import binary_format
+
+
+def class_name_of(file_path: str) -> str:
+    """ Returns the class name of a .db_<Class>.<ext> file path
+    """
+    match = re.match(r'\.db_(\w+)\.\w+$', path.basename(file_path))
+    if match is None:
+        raise ValueError("cannot tell the class of {}, use --class"
+                         .format(file_path))
+    return match.group(1)
+
+
+def convert(input_path: str, output_path: str,
+            class_name: str = None) -> int:
+    """ Converts a snapshot to the other format
+        Args:
+            input_path: the snapshot to read
+            output_path: the snapshot to write, replaced atomically
+            class_name: the class recorded in a binary output, defaults
+                        to the one in the input file name
+        Returns:
+            the number of objects converted
+    """
+    with open(input_path, 'rb') as f:
+        binary = f.read(len(binary_format.MAGIC)) == binary_format.MAGIC
+    if binary:
+        with open(input_path, 'rb') as f:
+            objs_json = binary_format.load(f)
+        with open(output_path + '.tmp', 'w') as f:
+            json.dump(objs_json, f)
+    else:
+        class_name = class_name or class_name_of(input_path)
+        with open(input_path, 'r') as f:
+            objs_json = json.load(f)
+        with open(output_path + '.tmp', 'wb') as f:
+            binary_format.dump(objs_json, f, class_name)
+    replace(output_path + '.tmp', output_path)
+    return len(objs_json)
+
+
+def main() -> None:
+    """ Command line entry point
+    """
+    parser = argparse.ArgumentParser(
+        description="Convert model snapshots between JSON and binary")
+    parser.add_argument('input', help="snapshot to convert")
+    parser.add_argument('output', help="converted snapshot")
+    parser.add_argument('--class', dest='class_name', default=None,
+                        help="class name of a JSON input, defaults to the "
+                             "one in its .db_<Class>.json file name")
+    args = parser.parse_args()
+
+    try:
+        count = convert(args.input, args.output, args.class_name)
+    except (OSError, ValueError) as e:
+        print("{}: {}".format(parser.prog, e), file=sys.stderr)
+        sys.exit(1)
+    print("{} objects converted".format(count), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+""" SQLite storage module
+"""
+import sqlite3
+import threading
+from typing import List, TypeVar
+
+
+class SQLiteStorage():
+    """ Storage engine keeping each model class in a SQLite table
+        The columns are the SCHEMA of the class, id being the primary key,
+        and each of its INDEXED_ATTRIBUTES gets an index
+        Objects are read from the database on demand, nothing is loaded
+        in memory; each thread uses its own connection
+    """
+
+    def __init__(self, db_path: str):
+        """ Initialize the storage on the database file db_path
+        """
+        self.db_path = db_path
+        self.local = threading.local()
+        self.tables = set()
+        self.tables_lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """ Return the connection of the current thread
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+        return conn
+
+    @staticmethod
+    def quote(name: str) -> str:
+        """ Quote a table or column name
+        """
+        return '"{}"'.format(name.replace('"', '""'))
+
+    def ensure_table(self, cls: type):
+        """ Create the table of cls and its indexes if needed
+            Columns added to the SCHEMA since the table was created are
+            added to it
+        """
+        s_class = cls.__name__
+        if s_class in self.tables:
+            return
+        with self.tables_lock:
+            if s_class in self.tables:
+                return
+            conn = self.connection()
+            table = self.quote(s_class)
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS {} ({} PRIMARY KEY)'
+                             .format(table, self.quote('id')))
+                columns = {row['name'] for row in conn.execute(
+                    'PRAGMA table_info({})'.format(table))}
+                for field in cls.SCHEMA:
+                    if field not in columns:
+                        conn.execute('ALTER TABLE {} ADD COLUMN {}'.format(
+                            table, self.quote(field)))
+                for attribute in cls.INDEXED_ATTRIBUTES:
+                    conn.execute('CREATE INDEX IF NOT EXISTS {} ON {} ({})'
+                                 .format(self.quote(s_class + '_' + attribute),
+                                         table, self.quote(attribute)))
+            self.tables.add(s_class)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update an object
+        """
+        cls = obj.__class__
+        self.ensure_table(cls)
+        values = obj.serialized()
+        fields = [field for field in cls.SCHEMA if field in values]
+        columns = ', '.join(self.quote(field) for field in fields)
+        updates = ', '.join('{0} = excluded.{0}'.format(self.quote(field))
+                            for field in fields if field != 'id')
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                'INSERT INTO {} ({}) VALUES ({}) '
+                'ON CONFLICT({}) DO UPDATE SET {}'.format(
+                    self.quote(cls.__name__), columns,
+                    ', '.join('?' * len(fields)), self.quote('id'), updates),
+                [values[field] for field in fields])
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        cls = obj.__class__
+        self.ensure_table(cls)
+        conn = self.connection()
+        with conn:
+            conn.execute('DELETE FROM {} WHERE {} = ?'.format(
+                self.quote(cls.__name__), self.quote('id')), (obj.id,))
+
+    def count(self, cls: type) -> int:
+        """ Count the objects of cls
+        """
+        self.ensure_table(cls)
+        return self.connection().execute('SELECT COUNT(*) FROM {}'.format(
+            self.quote(cls.__name__))).fetchone()[0]
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return the object of cls with this id, None if there is none
+        """
+        self.ensure_table(cls)
+        row = self.connection().execute(
+            'SELECT * FROM {} WHERE {} = ?'.format(
+                self.quote(cls.__name__), self.quote('id')),
+            (id,)).fetchone()
+        if row is None:
+            return None
+        return cls(**dict(row))
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Return the objects of cls with matching attributes, in
+            insertion order
+        """
+        self.ensure_table(cls)
+        for k in attributes:
+            if k not in cls.SCHEMA:
+                raise AttributeError("'{}' object has no attribute '{}'"
+                                     .format(cls.__name__, k))
+        query = 'SELECT * FROM {}'.format(self.quote(cls.__name__))
+        if attributes:
+            query += ' WHERE ' + ' AND '.join(
+                '{} IS ?'.format(self.quote(k)) for k in attributes)
+        query += ' ORDER BY rowid'
+        rows = self.connection().execute(query, list(attributes.values()))
+        return [cls(**dict(row)) for row in rows]
+
+    def page(self, cls: type, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return up to limit objects of cls ordered by id, starting
+            after the id after
+        """
+        self.ensure_table(cls)
+        query = 'SELECT * FROM {}'.format(self.quote(cls.__name__))
+        params = []
+        if after is not None:
+            query += ' WHERE {} > ?'.format(self.quote('id'))
+            params.append(after)
+        query += ' ORDER BY {}'.format(self.quote('id'))
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        rows = self.connection().execute(query, params)
+        return [cls(**dict(row)) for row in rows]
+
+    def page_end(self, cls: type, after: str = None,
+                 limit: int = 1) -> str:
+        """ Return the id of the last object page returns for after and
+            limit, None if it returns fewer than limit objects
+        """
+        self.ensure_table(cls)
+        query = 'SELECT {} FROM {}'.format(self.quote('id'),
+                                           self.quote(cls.__name__))
+        params = []
+        if after is not None:
+            query += ' WHERE {} > ?'.format(self.quote('id'))
+            params.append(after)
+        query += ' ORDER BY {} LIMIT 1 OFFSET ?'.format(self.quote('id'))
+        params.append(limit - 1)
+        row = self.connection().execute(query, params).fetchone()
+        return None if row is None else row[0]
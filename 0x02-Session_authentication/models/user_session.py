@@ -7,6 +7,11 @@ from models.base import Base
 class UserSession(Base):
     """ UserSession class
     """
+
+    FIELDS = ('user_id', 'session_id')
+    __slots__ = FIELDS
+    INDEXED_ATTRIBUTES = ('session_id',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Constructor for UserSession instance
         """